@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Helpers shared by the incremental and full-history fetchers
+Both write data.json, so posts must be decoded and fingerprinted the same way
+"""
+
+import heapq
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from blake3 import blake3
+import msgspec
+
+# Channel watermarks stripped from message text
+WATERMARKS = [
+    '**🔹 ****t.me/breachdetector**** 🔹**',
+    't.me/breachdetector',
+    '**🔹',
+    '🔹**'
+]
+
+# Watermarks and literal \n escapes, removed before decoding. Escaped quotes and \\n are
+# left for the JSON decoder, so string-encoded posts still unwrap
+_PRE_DECODE_RE = re.compile('|'.join(re.escape(watermark) for watermark in WATERMARKS) + r'|(?<!\\)\\n')
+
+# Enumerations of the optional schema.json fields
+SEVERITIES = frozenset({'low', 'medium', 'high', 'critical'})
+DATA_TYPES = frozenset({'emails', 'passwords', 'personal_info', 'financial', 'other'})
+
+class BreachMessage(msgspec.Struct):
+    """Breach post fields from schema.json, decoded straight from JSON by both fetchers"""
+    Source: str = 'Unknown'
+    Content: Union[str, msgspec.UnsetType] = msgspec.UNSET
+    author: Union[str, msgspec.UnsetType] = msgspec.UNSET
+    detection_date: Union[str, msgspec.UnsetType] = msgspec.field(default=msgspec.UNSET, name='Detection Date')
+    Type: str = 'Data leak'
+    severity: Union[str, msgspec.UnsetType] = msgspec.UNSET
+    affected_count: Union[int, msgspec.UnsetType] = msgspec.UNSET
+    data_types: Union[List[str], msgspec.UnsetType] = msgspec.UNSET
+
+# Decoders compiled once for the known schema; posts may be string-encoded JSON
+ENVELOPE_DECODER = msgspec.json.Decoder(Union[BreachMessage, str])
+MESSAGE_DECODER = msgspec.json.Decoder(BreachMessage)
+
+def configure_logging(log_file: str) -> None:
+    """Log to the console and to log_file, called from main() so importing a fetcher writes no files"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler()
+        ]
+    )
+
+def strip_watermarks(text: str) -> str:
+    """Remove watermarks and \\n escapes from raw post text ahead of JSON decoding"""
+    return _PRE_DECODE_RE.sub(lambda match: ' ' if match.group() == '\\n' else '', text).strip()
+
+def build_indicator_automaton(breach_indicators: Iterable[str], spam_indicators: Iterable[str]):
+    """Build a single Aho-Corasick automaton over breach and spam indicators"""
+    import ahocorasick  # Optional C extension, callers only build the automaton when it is installed
+    
+    automaton = ahocorasick.Automaton()
+    for kind, indicators in (('breach', breach_indicators), ('spam', spam_indicators)):
+        for indicator in indicators:
+            automaton.add_word(indicator, (kind, indicator))
+    automaton.make_automaton()
+    return automaton
+
+def normalize_optional_fields(parsed: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop or map decoded optional fields whose values fall outside schema.json"""
+    if parsed.get('severity', 'low') not in SEVERITIES:
+        del parsed['severity']
+    if parsed.get('affected_count', 0) < 0:
+        del parsed['affected_count']
+    if 'data_types' in parsed:
+        parsed['data_types'] = [kind if kind in DATA_TYPES else 'other' for kind in parsed['data_types']]
+    return parsed
+
+def content_hash(content: str) -> str:
+    """Deduplication fingerprint of the stripped Content, stored as hash_id"""
+    return blake3(content.strip().encode()).hexdigest(length=8)
+
+def recency_key(message: Dict[str, Any]) -> Tuple[str, int]:
+    """Sort key by timestamp then message id, rows missing both sort as oldest"""
+    return (message.get('timestamp') or '', message.get('message_id') or 0)
+
+def newest_first(messages: Iterable[Dict[str, Any]], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Order messages newest first, the data.json order, keeping only the newest `limit` when given"""
+    if limit is None:
+        return sorted(messages, key=recency_key, reverse=True)
+    # A bounded heap, so capping a long history never holds more than `limit` rows
+    return heapq.nlargest(limit, messages, key=recency_key)
@@ -5,57 +5,158 @@ Filters for JSON messages and applies relevance filters
 """
 
 import os
-import json
 import asyncio
 import base64
-import hashlib
 import logging
 import re
+import orjson
+import msgspec
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timezone
-from typing import List, Dict, Optional, Any
+from itertools import zip_longest
+from typing import List, Dict, Optional, Any, Tuple
 from telethon import TelegramClient
 from telethon.errors import FloodWaitError, SessionPasswordNeededError, AuthKeyUnregisteredError
 from telethon.tl.types import Message
 import yaml
-
-# Enhanced logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('full_history_fetch.log'),
-        logging.StreamHandler()
-    ]
+from breach_utils import (
+    WATERMARKS, BreachMessage, ENVELOPE_DECODER, MESSAGE_DECODER, build_indicator_automaton,
+    configure_logging, content_hash, newest_first, normalize_optional_fields, strip_watermarks
 )
+
+try:
+    import hyperscan
+except ImportError:  # Optional SIMD regex engine, fall back to Aho-Corasick
+    hyperscan = None
+
+try:
+    import ahocorasick
+except ImportError:  # Optional C extension, fall back to substring scans
+    ahocorasick = None
+
+# Handlers are installed by configure_logging() in main()
 logger = logging.getLogger(__name__)
 
 # Security constants
 SECURE_FILE_PERMISSIONS = 0o600
+_ZERO_PAGE = b'\x00' * 4096
 MAX_CONTENT_LENGTH = 2000
 MAX_SOURCE_LENGTH = 500
+MAX_AUTHOR_LENGTH = 100
+
+# Messages handed to each worker process
+BATCH_SIZE = 1000
+WORKER_COUNT = os.cpu_count() or 4
+
+# Precompiled patterns
+_BASE64_RE = re.compile(r'^[A-Za-z0-9+/]*={0,2}$')
+_DANGEROUS_RE = re.compile(r'[<>"\']')
+
+# Channel watermarks and escape sequences stripped in a single pass
+_ESCAPE_REPLACEMENTS = {'\\n': ' ', '\\"': '"'}
+_WATERMARK_RE = re.compile(
+    '|'.join(re.escape(token) for token in [*WATERMARKS, *_ESCAPE_REPLACEMENTS])
+)
+
+def _watermark_repl(match: re.Match) -> str:
+    """Drop watermarks and unescape escaped characters"""
+    return _ESCAPE_REPLACEMENTS.get(match.group(), '')
 
 # Allowed breach types
 ALLOWED_BREACH_TYPES = [
     "Data leak", "Security breach", "Privacy violation", 
     "Ransomware", "Malware", "Phishing", "DDoS", "Other"
 ]
+_ALLOWED_TYPES = frozenset(ALLOWED_BREACH_TYPES)
 
 # Relevance filters
-BREACH_INDICATORS = [
+BREACH_INDICATORS = frozenset({
     'leak', 'breach', 'hack', 'compromise', 'exposed', 'stolen', 'database',
     'credentials', 'password', 'email', 'personal data', 'user data',
     'customer data', 'financial data', 'credit card', 'ssn', 'social security',
-    'dump', 'database', 'records', 'accounts', 'users', 'customers',
+    'dump', 'records', 'accounts', 'users', 'customers',
     'financial', 'banking', 'payment', 'transaction', 'identity', 'personal',
     'address', 'phone', 'dob', 'date of birth', 'national id', 'passport'
-]
+})
 
-SPAM_INDICATORS = [
+SPAM_INDICATORS = frozenset({
     'buy', 'sell', 'offer', 'discount', 'promotion', 'service', 'tool',
     'software', 'review', 'rating', 'backlink', 'seo', 'marketing',
     'advertisement', 'sponsored', 'deal', 'sale', 'free trial', 'subscribe',
     'join', 'telegram.me', 't.me', 'channel', 'group', 'bot', 'premium'
-]
+})
+
+# Stable indicator ordering for the matchers below
+_BREACH_TUPLE = tuple(sorted(BREACH_INDICATORS))
+_SPAM_TUPLE = tuple(sorted(SPAM_INDICATORS))
+
+def _build_indicator_database():
+    """Compile breach and spam indicators into one Hyperscan block-mode database"""
+    indicators = (*_BREACH_TUPLE, *_SPAM_TUPLE)
+    database = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+    database.compile(
+        expressions=[re.escape(indicator).encode() for indicator in indicators],
+        ids=list(range(len(indicators))),
+        elements=len(indicators),
+        flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH] * len(indicators)
+    )
+    return database
+
+def _relevant_with_hyperscan(content_lower: str) -> bool:
+    """Score distinct breach and spam indicators with the Hyperscan database"""
+    scores = [0, 0]
+    breach_count = len(_BREACH_TUPLE)
+    
+    def on_match(indicator_id, start, end, flags, context):
+        scores[indicator_id >= breach_count] += 1
+    
+    _INDICATOR_DB.scan(content_lower.encode(), match_event_handler=on_match)
+    breach_score, spam_score = scores
+    return breach_score > spam_score and breach_score > 0
+
+def _relevant_with_automaton(content_lower: str) -> bool:
+    """Score distinct breach and spam indicators with the Aho-Corasick automaton"""
+    breach_hits = set()
+    spam_hits = set()
+    for _, (kind, indicator) in _INDICATOR_AC.iter(content_lower):
+        (breach_hits if kind == 'breach' else spam_hits).add(indicator)
+    return len(breach_hits) > len(spam_hits) and len(breach_hits) > 0
+
+def _relevant_with_substrings(content_lower: str) -> bool:
+    """Score indicators with substring scans, stopping once the outcome is decided"""
+    breach_score = spam_score = 0
+    breach_left = len(_BREACH_TUPLE)
+    spam_left = len(_SPAM_TUPLE)
+    
+    for breach_indicator, spam_indicator in zip_longest(_BREACH_TUPLE, _SPAM_TUPLE):
+        if breach_indicator is not None:
+            breach_left -= 1
+            if breach_indicator in content_lower:
+                breach_score += 1
+        if spam_indicator is not None:
+            spam_left -= 1
+            if spam_indicator in content_lower:
+                spam_score += 1
+        
+        # Remaining breach indicators can no longer outscore spam
+        if breach_score + breach_left <= spam_score:
+            return False
+        # Remaining spam indicators can no longer catch up with breach
+        if breach_score > spam_score + spam_left:
+            return True
+    
+    return breach_score > spam_score and breach_score > 0
+
+# Pick the fastest indicator matcher available
+if hyperscan is not None:
+    _INDICATOR_DB = _build_indicator_database()
+    _is_relevant = _relevant_with_hyperscan
+elif ahocorasick is not None:
+    _INDICATOR_AC = build_indicator_automaton(_BREACH_TUPLE, _SPAM_TUPLE)
+    _is_relevant = _relevant_with_automaton
+else:
+    _is_relevant = _relevant_with_substrings
 
 class FullHistoryFetcher:
     """Fetch entire channel history with filtering"""
@@ -66,6 +167,7 @@ class FullHistoryFetcher:
         self.session_base64 = os.getenv('TELEGRAM_SESSION_BASE64')
         self.channel = os.getenv('CHANNEL', 'breachdetector')
         self.session_file = 'telegram_session.session'
+        self.spool_file = 'data.ndjson.tmp'
         
     def create_session_file(self) -> bool:
         """Create session file from base64"""
@@ -75,7 +177,7 @@ class FullHistoryFetcher:
         
         try:
             # Validate base64 format
-            if not re.match(r'^[A-Za-z0-9+/]*={0,2}$', self.session_base64):
+            if not _BASE64_RE.match(self.session_base64):
                 logger.error("Invalid base64 format for session data")
                 return False
             
@@ -96,153 +198,181 @@ class FullHistoryFetcher:
         """Securely cleanup session file"""
         try:
             if os.path.exists(self.session_file):
-                with open(self.session_file, 'wb') as f:
-                    f.write(b'\x00' * os.path.getsize(self.session_file))
+                # Overwrite in place with a reusable zero page before removing
+                remaining = os.path.getsize(self.session_file)
+                with open(self.session_file, 'r+b') as f:
+                    while remaining > 0:
+                        remaining -= f.write(_ZERO_PAGE[:remaining])
+                    f.flush()
+                    os.fsync(f.fileno())
                 os.remove(self.session_file)
                 logger.info("✅ Session file securely cleaned up")
         except Exception as e:
             logger.error(f"Error cleaning up session file: {e}")
     
-    def clean_text(self, text: str) -> str:
+    @staticmethod
+    def clean_text(text: str) -> str:
         """Clean message text"""
         if not isinstance(text, str):
             return ""
         
-        # Remove watermarks
-        watermarks = [
-            '**🔹 ****t.me/breachdetector**** 🔹**',
-            't.me/breachdetector',
-            '**🔹',
-            '🔹**'
-        ]
-        
-        clean_text = text
-        for watermark in watermarks:
-            clean_text = clean_text.replace(watermark, '')
-        
-        # Handle escaped characters
-        clean_text = clean_text.replace('\\n', ' ').replace('\\"', '"')
+        # Remove watermarks and handle escaped characters
+        clean_text = _WATERMARK_RE.sub(_watermark_repl, text)
         
         # Remove potentially dangerous characters
-        clean_text = re.sub(r'[<>"\']', '', clean_text)
+        clean_text = _DANGEROUS_RE.sub('', clean_text)
         
         return clean_text.strip()
     
-    def is_json_message(self, text: str) -> bool:
-        """Check if message contains valid JSON"""
+    @staticmethod
+    def _try_parse(text: str) -> Optional[BreachMessage]:
+        """Decode raw post text into a BreachMessage, unwrapping string-encoded JSON"""
         try:
-            clean_text = self.clean_text(text)
-            
-            # Try to parse as JSON
-            for attempt in range(2):
-                try:
-                    parsed = json.loads(clean_text)
-                    if isinstance(parsed, dict):
-                        return True
-                    elif isinstance(parsed, str):
-                        clean_text = parsed
-                        continue
-                except json.JSONDecodeError:
-                    break
-            
-            return False
-        except Exception:
-            return False
+            # Watermarks around or inside a JSON post would break decoding
+            parsed = ENVELOPE_DECODER.decode(strip_watermarks(text))
+            if isinstance(parsed, str):
+                parsed = MESSAGE_DECODER.decode(parsed)
+        except msgspec.DecodeError:
+            return None
+        
+        return parsed
     
-    def is_relevant_breach(self, content: str) -> bool:
-        """Check if content is a relevant breach"""
-        if not content:
+    @staticmethod
+    def is_relevant_breach(content_lower: str) -> bool:
+        """Check if already-lowercased content is a relevant breach"""
+        if not content_lower:
             return False
             
-        content_lower = content.lower()
-        
-        # Check for spam indicators
-        spam_score = sum(1 for indicator in SPAM_INDICATORS 
-                        if indicator in content_lower)
-        
-        # Check for breach indicators
-        breach_score = sum(1 for indicator in BREACH_INDICATORS 
-                          if indicator in content_lower)
-        
         # Content is relevant if it has more breach indicators than spam
-        return breach_score > spam_score and breach_score > 0
+        return _is_relevant(content_lower)
     
-    def parse_json_message(self, message_text: str) -> Optional[Dict[str, Any]]:
-        """Parse JSON message with validation"""
+    @staticmethod
+    def validate_parsed(message: BreachMessage, clean_text: str) -> Optional[Dict[str, Any]]:
+        """Validate a decoded message and apply relevance filters"""
         try:
-            if not isinstance(message_text, str):
-                return None
-                
-            clean_text = self.clean_text(message_text)
+            # Convert to a plain dict and scrub decoded fields like plain text,
+            # falling back to the cleaned whole post for Content
+            parsed = msgspec.to_builtins(message)
+            for key, value in parsed.items():
+                if isinstance(value, str):
+                    parsed[key] = FullHistoryFetcher.clean_text(value)
+            if not parsed.get('Content'):
+                parsed['Content'] = clean_text
             
-            # Validate content length
-            if len(clean_text) > MAX_CONTENT_LENGTH:
-                clean_text = clean_text[:MAX_CONTENT_LENGTH]
+            # Validate known field lengths and breach type
+            parsed['Content'] = parsed['Content'][:MAX_CONTENT_LENGTH]
+            parsed['Source'] = parsed['Source'][:MAX_SOURCE_LENGTH] or 'Unknown'
+            if 'author' in parsed:
+                parsed['author'] = parsed['author'][:MAX_AUTHOR_LENGTH]
+            if parsed['Type'] not in _ALLOWED_TYPES:
+                parsed['Type'] = "Other"
+            normalize_optional_fields(parsed)
             
-            # Try to parse as JSON
-            for attempt in range(2):
-                try:
-                    parsed = json.loads(clean_text)
-                    if isinstance(parsed, str):
-                        clean_text = parsed
-                        continue
-                    
-                    # Validate parsed JSON structure
-                    if isinstance(parsed, dict):
-                        # Ensure required fields exist
-                        if 'Content' not in parsed:
-                            parsed['Content'] = clean_text
-                        if 'Source' not in parsed:
-                            parsed['Source'] = 'Unknown'
-                        if 'Type' not in parsed:
-                            parsed['Type'] = 'Data leak'
-                        
-                        # Validate field types and lengths
-                        for key, value in parsed.items():
-                            if isinstance(value, str):
-                                if key == 'Content' and len(value) > MAX_CONTENT_LENGTH:
-                                    parsed[key] = value[:MAX_CONTENT_LENGTH]
-                                elif key == 'Source' and len(value) > MAX_SOURCE_LENGTH:
-                                    parsed[key] = value[:MAX_SOURCE_LENGTH]
-                                elif key == 'Type':
-                                    # Validate breach type
-                                    if value not in ALLOWED_BREACH_TYPES:
-                                        parsed[key] = "Other"
-                        
-                        # Check relevance
-                        if self.is_relevant_breach(parsed.get('Content', '')):
-                            return parsed
-                        else:
-                            logger.debug(f"Skipping non-relevant message: {parsed.get('Content', '')[:100]}...")
-                            return None
-                    
-                    return None
-                except json.JSONDecodeError:
-                    break
+            # Check relevance, lowercasing the content only once
+            content_lower = parsed['Content'].lower()
+            if FullHistoryFetcher.is_relevant_breach(content_lower):
+                return parsed
             
+            logger.debug(f"Skipping non-relevant message: {parsed.get('Content', '')[:100]}...")
             return None
             
         except Exception as e:
             logger.warning(f"Failed to parse message content: {e}")
             return None
     
-    async def fetch_entire_history(self) -> List[Dict[str, Any]]:
-        """Fetch entire channel history"""
+    @staticmethod
+    def process_batch(batch: List[Tuple[int, str, str]]) -> Tuple[int, List[Dict[str, Any]]]:
+        """Clean, parse, filter and hash a batch of (id, timestamp, text) messages"""
+        json_messages = 0
+        relevant = []
+        
+        for message_id, timestamp, text in batch:
+            # Decode the whole post before scrubbing, clean_text strips the quotes JSON needs.
+            # Telegram bounds posts at 4096 characters, and Content is capped after decoding
+            parsed = FullHistoryFetcher._try_parse(text)
+            if parsed is None:
+                continue
+            json_messages += 1
+            
+            # Validate and apply relevance filters, Content is capped after decoding
+            parsed_content = FullHistoryFetcher.validate_parsed(parsed, FullHistoryFetcher.clean_text(text))
+            if parsed_content:
+                # Add message metadata
+                parsed_content['message_id'] = message_id
+                parsed_content['timestamp'] = timestamp
+                parsed_content['hash_id'] = content_hash(parsed_content['Content'])
+                relevant.append(parsed_content)
+        
+        return json_messages, relevant
+    
+    async def _batch_worker(self, queue: asyncio.Queue, executor: ProcessPoolExecutor,
+                            spool, stats: Dict[str, int]):
+        """Process queued batches in the executor and spool results until a sentinel arrives"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                return
+            
+            try:
+                json_messages, relevant = await loop.run_in_executor(executor, self.process_batch, batch)
+            except BrokenProcessPool:
+                # A worker process died, so every later batch would fail as well
+                raise
+            except Exception as e:
+                logger.error(f"Error processing batch: {e}")
+                continue
+            
+            # Persist accepted records immediately instead of holding them in memory.
+            # A failed write propagates, fetch_entire_history then stops the producer
+            for parsed_content in relevant:
+                spool.write(orjson.dumps(parsed_content, option=orjson.OPT_APPEND_NEWLINE))
+            stats['json_messages'] += json_messages
+            stats['relevant_messages'] += len(relevant)
+    
+    async def _produce_batches(self, client, channel, queue: asyncio.Queue, worker_count: int) -> int:
+        """Queue batches of candidate posts for the workers, then one sentinel per worker"""
+        total_messages = 0
+        batch = []
+        async for message in client.iter_messages(channel, limit=None):  # No limit = all messages
+            total_messages += 1
+            text = message.text
+            
+            # Cheap screen before any cleaning or parsing: breach posts
+            # always name a schema field, even when double-encoded
+            if not text or ('Content' not in text and 'Source' not in text):
+                continue
+            
+            batch.append((message.id, message.date.isoformat(), text))
+            if len(batch) >= BATCH_SIZE:
+                await queue.put(batch)
+                batch = []
+                logger.info(f"Fetched {total_messages} messages...")
+        
+        if batch:
+            await queue.put(batch)
+        
+        for _ in range(worker_count):
+            await queue.put(None)
+        return total_messages
+    
+    async def fetch_entire_history(self) -> int:
+        """Fetch entire channel history, spooling relevant messages to disk"""
         if not self.api_id or not self.api_hash:
             logger.error("API_ID and API_HASH environment variables are required")
             logger.error(f"API_ID: {'SET' if self.api_id else 'MISSING'}")
             logger.error(f"API_HASH: {'SET' if self.api_hash else 'MISSING'}")
             logger.error(f"SESSION_BASE64: {'SET' if self.session_base64 else 'MISSING'}")
-            return []
+            return 0
         
         if not self.session_base64:
             logger.error("TELEGRAM_SESSION_BASE64 is required")
-            return []
+            return 0
         
         try:
             # Create session file
             if not self.create_session_file():
-                return []
+                return 0
             
             # Create client
             client = TelegramClient('telegram_session', self.api_id, self.api_hash)
@@ -252,7 +382,7 @@ class FullHistoryFetcher:
             
             if not await client.is_user_authorized():
                 logger.error("Session file is invalid or expired")
-                return []
+                return 0
             
             logger.info(f"Fetching entire history from @{self.channel}...")
             
@@ -261,105 +391,111 @@ class FullHistoryFetcher:
                 channel = await client.get_entity(f"@{self.channel}")
             except Exception as e:
                 logger.error(f"Could not find channel @{self.channel}: {e}")
-                return []
+                return 0
             
             # Fetch ALL messages (no limit)
-            all_messages = []
-            json_messages = 0
-            relevant_messages = 0
+            stats = {'json_messages': 0, 'relevant_messages': 0}
             
             logger.info("Starting to fetch messages (this may take a while)...")
             
-            async for message in client.iter_messages(channel, limit=None):  # No limit = all messages
-                if message.text:
-                    # Check if it's a JSON message
-                    if self.is_json_message(message.text):
-                        json_messages += 1
-                        
-                        # Parse and validate
-                        parsed_content = self.parse_json_message(message.text)
-                        if parsed_content:
-                            # Add message metadata
-                            parsed_content['message_id'] = message.id
-                            parsed_content['timestamp'] = message.date.isoformat()
-                            parsed_content['hash_id'] = hashlib.sha256(
-                                parsed_content.get('Content', '').encode()
-                            ).hexdigest()[:16]
-                            
-                            all_messages.append(parsed_content)
-                            relevant_messages += 1
-                            
-                            # Log progress every 100 messages
-                            if relevant_messages % 100 == 0:
-                                logger.info(f"Processed {relevant_messages} relevant messages...")
+            # Download in a producer loop while worker tasks process full batches
+            queue = asyncio.Queue(maxsize=WORKER_COUNT * 2)
+            
+            with open(self.spool_file, 'wb') as spool, ProcessPoolExecutor(max_workers=WORKER_COUNT) as executor:
+                workers = [
+                    asyncio.create_task(self._batch_worker(queue, executor, spool, stats))
+                    for _ in range(WORKER_COUNT)
+                ]
+                producer = asyncio.create_task(self._produce_batches(client, channel, queue, len(workers)))
+                tasks = [producer, *workers]
+                try:
+                    # The first failure ends the fetch, so a dead worker never leaves
+                    # the producer blocked on a full queue
+                    done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+                    for task in done:
+                        task.result()
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                total_messages = producer.result()
             
             logger.info(f"✅ Fetch completed!")
-            logger.info(f"   - Total messages processed: {len(list(client.iter_messages(channel, limit=None)))}")
-            logger.info(f"   - JSON messages found: {json_messages}")
-            logger.info(f"   - Relevant breach messages: {relevant_messages}")
+            logger.info(f"   - Total messages processed: {total_messages}")
+            logger.info(f"   - JSON messages found: {stats['json_messages']}")
+            logger.info(f"   - Relevant breach messages: {stats['relevant_messages']}")
             
             await client.disconnect()
-            return all_messages
+            return stats['relevant_messages']
             
         except SessionPasswordNeededError:
             logger.error("Two-factor authentication is enabled. Cannot automate this.")
-            return []
+            return 0
         except AuthKeyUnregisteredError:
             logger.error("Session is invalid. Please regenerate session file.")
-            return []
+            return 0
+        except BrokenProcessPool:
+            # The spool is incomplete, fail the run instead of letting main() save it
+            logger.error("A worker process died, aborting the fetch")
+            raise
         except Exception as e:
             logger.error(f"Error fetching messages: {e}")
-            return []
+            return 0
         finally:
             self.cleanup_session_file()
     
-    def save_data(self, messages: List[Dict[str, Any]]):
-        """Save filtered messages to data.json"""
+    def save_data(self):
+        """Deduplicate spooled messages and save them to data.json"""
         try:
-            # Remove duplicates based on hash_id
-            seen_hashes = set()
-            unique_messages = []
-            
-            for msg in messages:
-                hash_id = msg.get('hash_id')
-                if hash_id and hash_id not in seen_hashes:
-                    seen_hashes.add(hash_id)
-                    unique_messages.append(msg)
+            # Stream the spool back, keeping the newest copy of each hash_id
+            unique = {}
+            spooled_messages = 0
+            with open(self.spool_file, 'rb') as f:
+                for line in f:
+                    msg = orjson.loads(line)
+                    spooled_messages += 1
+                    kept = unique.get(msg['hash_id'])
+                    if kept is None or msg['timestamp'] > kept['timestamp']:
+                        unique[msg['hash_id']] = msg
             
-            logger.info(f"Removed {len(messages) - len(unique_messages)} duplicates")
+            logger.info(f"Removed {spooled_messages - len(unique)} duplicates")
             
-            # Sort by timestamp (newest first)
-            unique_messages.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+            # Sort newest first, the same order the incremental fetch saves
+            messages = newest_first(unique.values())
             
             # Save to file
-            with open('data.json', 'w', encoding='utf-8') as f:
-                json.dump(unique_messages, f, indent=2, ensure_ascii=False)
+            with open('data.json', 'wb') as f:
+                f.write(orjson.dumps(messages, option=orjson.OPT_INDENT_2))
             
-            logger.info(f"✅ Saved {len(unique_messages)} unique relevant messages to data.json")
+            logger.info(f"✅ Saved {len(messages)} unique relevant messages to data.json")
             
-            # Create backup
-            backup_file = f"data_backup_full_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            with open(backup_file, 'w', encoding='utf-8') as f:
-                json.dump(unique_messages, f, indent=2, ensure_ascii=False)
+            # Create backup as NDJSON, one record per line, so it can be streamed
+            backup_file = f"data_backup_full_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson"
+            with open(backup_file, 'wb') as f:
+                for msg in messages:
+                    f.write(orjson.dumps(msg, option=orjson.OPT_APPEND_NEWLINE))
             
             logger.info(f"✅ Created backup: {backup_file}")
             
+            os.remove(self.spool_file)
+            
         except Exception as e:
             logger.error(f"Error saving data: {e}")
 
 async def main():
     """Main function"""
+    configure_logging('full_history_fetch.log')
     logger.info("🚀 Starting full history fetch...")
     
     fetcher = FullHistoryFetcher()
     
     try:
         # Fetch entire history
-        messages = await fetcher.fetch_entire_history()
+        relevant_messages = await fetcher.fetch_entire_history()
         
-        if messages:
+        if relevant_messages:
             # Save filtered data
-            fetcher.save_data(messages)
+            fetcher.save_data()
             logger.info("🎉 Full history fetch completed successfully!")
         else:
             logger.warning("No relevant messages found")
@@ -5,39 +5,207 @@ Uses GitHub secrets to handle session files securely with better error handling
 """
 
 import os
-import json
 import asyncio
 import base64
-import hashlib
 import logging
 import re
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Iterable, Iterator, AsyncIterator, Tuple
 from dataclasses import dataclass, asdict
+from functools import cached_property
+from concurrent.futures import Executor
+from itertools import chain, islice
+from pathlib import Path
+from blake3 import blake3
+import orjson
+import msgspec
 from telethon import TelegramClient
 from telethon.errors import FloodWaitError, SessionPasswordNeededError, AuthKeyUnregisteredError
 from telethon.tl.types import Message
-import aiofiles
 import yaml
+from breach_utils import (
+    WATERMARKS, ENVELOPE_DECODER, MESSAGE_DECODER, build_indicator_automaton, configure_logging,
+    content_hash, newest_first, normalize_optional_fields, strip_watermarks
+)
+
+try:
+    import re2 as re_fast
+except ImportError:  # google-re2 is optional, fall back to the stdlib engine
+    re_fast = re
+
+try:
+    import ahocorasick
+except ImportError:  # Optional C extension, fall back to substring scans
+    ahocorasick = None
+
+try:
+    import ijson
+except ImportError:  # Optional streaming parser, fall back to a whole-file orjson load
+    ijson = None
 
 # Security constants
 SECURE_FILE_PERMISSIONS = 0o600
+_ZERO_PAGE = b'\x00' * 4096
 MAX_CONTENT_LENGTH = 2000
 MAX_SOURCE_LENGTH = 500
+MAX_AUTHOR_LENGTH = 100
+MAX_STORED_MESSAGES = 10000  # Prevent excessive growth of data.json
+SAVE_CHUNK_SIZE = 1000  # Records encoded per write when saving data.json
+LOAD_CHUNK_SIZE = 1000  # Records read per worker-thread call when streaming data.json
+DEDUP_SHARD_SIZE = 10000  # Messages classified per task in sharded deduplication
 ALLOWED_BREACH_TYPES = ["Data leak", "Security breach", "Privacy violation", "Ransomware", "Malware", "Phishing", "DDoS", "Other"]
 
-# Enhanced logging configuration
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('telegram_fetcher.log'),
-        logging.StreamHandler()
-    ]
-)
+# Precompiled patterns, using linear-time RE2 for untrusted input when available
+_CHANNEL_RE = re_fast.compile(r'[a-zA-Z0-9_]+')
+_DANGEROUS_RE = re_fast.compile(r'[<>"\']')
+_HASH_ID_RE = re.compile(r'[a-f0-9]{16}')
+
+# Watermarks and dangerous characters removed in a single scan. Literal alternations
+# cannot backtrack, and on short messages the stdlib engine avoids RE2's per-call overhead
+_SCRUB_RE = re.compile('|'.join(re.escape(watermark) for watermark in WATERMARKS) + r'|[<>"\']')
+
+# Handlers are installed by configure_logging() in main()
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Keywords that indicate actual breaches vs spam/ads
+BREACH_INDICATORS = frozenset([
+    'leak', 'breach', 'hack', 'compromise', 'exposed', 'stolen', 'database',
+    'credentials', 'password', 'email', 'personal data', 'user data',
+    'customer data', 'financial data', 'credit card', 'ssn', 'social security'
+])
+
+SPAM_INDICATORS = frozenset([
+    'buy', 'sell', 'offer', 'discount', 'promotion', 'service', 'tool',
+    'software', 'review', 'rating', 'backlink', 'seo', 'marketing',
+    'advertisement', 'sponsored', 'deal', 'sale', 'free trial'
+])
+
+# One linear scan finds every indicator when pyahocorasick is installed
+_INDICATOR_AC = (build_indicator_automaton(BREACH_INDICATORS, SPAM_INDICATORS)
+                 if ahocorasick is not None else None)
+
+def clean_text(text: str) -> str:
+    """Clean message text from watermarks and formatting with security checks"""
+    if not isinstance(text, str):
+        return ""
+    
+    # Handle escaped characters, then strip watermarks and dangerous characters
+    cleaned = text.replace('\\n', ' ').replace('\\"', '"')
+    cleaned = _SCRUB_RE.sub('', cleaned)
+    
+    return cleaned.strip()
+
+def parse_message_content(message_text: str) -> Optional[Dict[str, Any]]:
+    """Parse message content with enhanced error handling and validation"""
+    try:
+        if not isinstance(message_text, str):
+            return None
+            
+        # Watermarks around or inside a JSON post would break decoding
+        text = strip_watermarks(message_text)
+        message = None
+        
+        # Decode before scrubbing, clean_text strips the quotes JSON needs. Only objects and
+        # string-encoded JSON are decoded, plain text skips the parser
+        try:
+            if text[:1] in ('{', '"'):
+                message = ENVELOPE_DECODER.decode(text)
+                if isinstance(message, str):
+                    text = message.strip()
+                    message = MESSAGE_DECODER.decode(text) if text[:1] == '{' else None
+        except msgspec.DecodeError:
+            message = None
+        
+        cleaned = clean_text(text)
+        
+        # Validate content length
+        if len(cleaned) > MAX_CONTENT_LENGTH:
+            cleaned = cleaned[:MAX_CONTENT_LENGTH]
+        
+        if message is not None:
+            parsed = msgspec.to_builtins(message)
+            
+            # Scrub decoded fields like plain text, falling back to the whole post for Content
+            for key, value in parsed.items():
+                if isinstance(value, str):
+                    parsed[key] = clean_text(value)
+            if not parsed.get('Content'):
+                parsed['Content'] = cleaned
+            
+            # Validate field lengths and breach type
+            parsed['Content'] = parsed['Content'][:MAX_CONTENT_LENGTH]
+            parsed['Source'] = parsed['Source'][:MAX_SOURCE_LENGTH] or 'Unknown'
+            if 'author' in parsed:
+                parsed['author'] = parsed['author'][:MAX_AUTHOR_LENGTH]
+            if parsed['Type'] not in ALLOWED_BREACH_TYPES:
+                parsed['Type'] = "Other"
+            return normalize_optional_fields(parsed)
+        
+        # If JSON parsing fails, return as plain text
+        return {"Content": cleaned, "Source": "Unknown", "Type": "Data leak"}
+        
+    except Exception as e:
+        logger.warning(f"Failed to parse message content: {e}")
+        return None
+
+def is_legitimate_breach(content: str) -> bool:
+    """Check if content represents a legitimate breach vs spam/ad"""
+    if not content:
+        return False
+        
+    content_lower = content.lower()
+    
+    if _INDICATOR_AC is not None:
+        # Score distinct indicators, matching the substring scans below
+        breach_hits = set()
+        spam_hits = set()
+        for _, (kind, indicator) in _INDICATOR_AC.iter(content_lower):
+            (breach_hits if kind == 'breach' else spam_hits).add(indicator)
+        return len(breach_hits) > len(spam_hits) and len(breach_hits) > 0
+    
+    # Check for spam indicators
+    spam_score = sum(1 for indicator in SPAM_INDICATORS 
+                    if indicator in content_lower)
+    
+    # Check for breach indicators
+    breach_score = sum(1 for indicator in BREACH_INDICATORS 
+                      if indicator in content_lower)
+    
+    # Content is legitimate if it has more breach indicators than spam
+    return breach_score > spam_score and breach_score > 0
+
+def validate_message_structure(message: Dict[str, Any]) -> bool:
+    """Validate message structure with enhanced checks"""
+    required_fields = ['Content']
+    
+    # Check required fields exist
+    if not all(field in message for field in required_fields):
+        return False
+    
+    # Check content is not empty
+    content = message.get('Content', '').strip()
+    if not content:
+        return False
+    
+    # Check content length
+    if len(content) > MAX_CONTENT_LENGTH:
+        return False
+    
+    # Check if it's a legitimate breach
+    return is_legitimate_breach(content)
+
+def classify_messages(messages: List[Dict[str, Any]]) -> List[Optional[Tuple[str, bool]]]:
+    """Fingerprint and classify a shard of messages, None marks rows without content"""
+    classified = []
+    for msg in messages:
+        content = msg.get('Content', '').strip()
+        if not content:
+            classified.append(None)
+            continue
+        classified.append((msg.get('hash_id') or content_hash(content), is_legitimate_breach(content)))
+    return classified
+
+@dataclass(slots=True)
 class BreachEntry:
     """Structured breach data entry"""
     source: str
@@ -50,13 +218,12 @@ class BreachEntry:
     hash_id: Optional[str] = None
     
     def __post_init__(self):
-        """Generate hash ID for deduplication and validate data"""
-        if not self.hash_id:
-            content_hash = hashlib.sha256(self.content.encode()).hexdigest()[:16]
-            self.hash_id = f"{self.source}_{content_hash}"
-        
-        # Validate and sanitize data
+        """Validate data and generate hash ID for deduplication"""
+        # Validate and sanitize first so the hash never covers more than the stored content
         self._validate_and_sanitize()
+        
+        if not self.hash_id:
+            self.hash_id = f"{self.source}_{content_hash(self.content)}"
     
     def _validate_and_sanitize(self):
         """Validate and sanitize breach entry data"""
@@ -73,22 +240,42 @@ class BreachEntry:
             self.breach_type = "Other"
         
         # Sanitize author (remove potentially malicious characters)
-        self.author = re.sub(r'[<>"\']', '', self.author)[:100]
+        self.author = _DANGEROUS_RE.sub('', self.author)[:MAX_AUTHOR_LENGTH]
 
+@dataclass(frozen=True, slots=True)
 class Config:
     """Configuration management with validation"""
+    api_id: Optional[str] = None
+    api_hash: Optional[str] = None
+    session_base64: Optional[str] = None
+    # CHANNEL may list several comma-separated channels, fetched concurrently
+    channel: str = 'breachdetector'
+    message_limit: int = 5000
+    max_file_size: int = 50 * 1024 * 1024  # 50MB default
+    retry_attempts: int = 3
+    retry_delay: int = 60
+    max_concurrent_fetches: int = 4
+    
+    @classmethod
+    def from_env(cls) -> 'Config':
+        """Build configuration from environment variables"""
+        return cls(
+            api_id=os.getenv('API_ID'),
+            api_hash=os.getenv('API_HASH'),
+            session_base64=os.getenv('TELEGRAM_SESSION_BASE64'),
+            channel=os.getenv('CHANNEL', 'breachdetector'),
+            message_limit=int(os.getenv('MESSAGE_LIMIT', '5000')),
+            max_file_size=int(os.getenv('MAX_FILE_SIZE_MB', '50')) * 1024 * 1024,
+            retry_attempts=int(os.getenv('RETRY_ATTEMPTS', '3')),
+            retry_delay=int(os.getenv('RETRY_DELAY_SECONDS', '60')),
+            max_concurrent_fetches=int(os.getenv('MAX_CONCURRENT_FETCHES', '4'))
+        )
+    
+    @property
+    def channels(self) -> List[str]:
+        """Channel names parsed from the comma-separated channel setting"""
+        return [name.strip() for name in self.channel.split(',') if name.strip()]
     
-    def __init__(self):
-        self.api_id = os.getenv('API_ID')
-        self.api_hash = os.getenv('API_HASH')
-        self.session_base64 = os.getenv('TELEGRAM_SESSION_BASE64')
-        self.channel = os.getenv('CHANNEL', 'breachdetector')
-        self.message_limit = int(os.getenv('MESSAGE_LIMIT', '5000'))
-        self.max_file_size = int(os.getenv('MAX_FILE_SIZE_MB', '50')) * 1024 * 1024  # 50MB default
-        self.backup_enabled = os.getenv('BACKUP_ENABLED', 'true').lower() == 'true'
-        self.retry_attempts = int(os.getenv('RETRY_ATTEMPTS', '3'))
-        self.retry_delay = int(os.getenv('RETRY_DELAY_SECONDS', '60'))
-        
     def validate(self) -> bool:
         """Validate configuration with enhanced security checks"""
         if not self.api_id or not self.api_hash:
@@ -104,7 +291,7 @@ class Config:
             return False
         
         # Validate channel name format
-        if not re.match(r'^[a-zA-Z0-9_]+$', self.channel):
+        if not self.channels or not all(_CHANNEL_RE.fullmatch(name) for name in self.channels):
             logger.error("Channel name contains invalid characters")
             return False
             
@@ -117,6 +304,11 @@ class SecureSessionManager:
         self.session_base64 = session_base64
         self.session_file = 'telegram_session.session'
         self.session_checksum = None
+    
+    @cached_property
+    def _session_data(self) -> bytes:
+        """Session bytes decoded once, raises ValueError on malformed base64"""
+        return base64.b64decode(self.session_base64.strip(), validate=True)
         
     def create_session_file(self) -> bool:
         """Create session file with integrity checking and secure permissions"""
@@ -125,24 +317,23 @@ class SecureSessionManager:
             return False
         
         try:
-            # Validate base64 format
-            if not re.match(r'^[A-Za-z0-9+/]*={0,2}$', self.session_base64):
+            # Validate and decode base64 session data in a single pass, cached for repeated calls
+            try:
+                session_data = self._session_data
+            except ValueError:  # binascii.Error or non-ASCII input
                 logger.error("Invalid base64 format for session data")
                 return False
             
-            # Decode base64 session data
-            session_data = base64.b64decode(self.session_base64)
-            
-            # Calculate checksum for integrity
-            self.session_checksum = hashlib.sha256(session_data).hexdigest()
+            # Calculate checksum for integrity, logged so runs can tell which secret was used
+            self.session_checksum = blake3(session_data).hexdigest()
             
-            # Write to session file with secure permissions
-            with open(self.session_file, 'wb') as f:
+            # Create the file with secure permissions so it is never readable by others
+            fd = os.open(self.session_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, SECURE_FILE_PERMISSIONS)
+            with os.fdopen(fd, 'wb') as f:
+                # The mode only applies on creation, so tighten a stale file too
+                os.fchmod(fd, SECURE_FILE_PERMISSIONS)
                 f.write(session_data)
             
-            # Set secure file permissions
-            os.chmod(self.session_file, SECURE_FILE_PERMISSIONS)
-            
             logger.info(f"✅ Session file created with secure permissions (checksum: {self.session_checksum[:16]}...)")
             return True
             
@@ -153,15 +344,26 @@ class SecureSessionManager:
     def cleanup_session_file(self):
         """Remove session file and clear sensitive data"""
         try:
-            if os.path.exists(self.session_file):
-                # Securely overwrite file before deletion
-                with open(self.session_file, 'wb') as f:
-                    f.write(b'\x00' * os.path.getsize(self.session_file))
-                os.remove(self.session_file)
+            # Open directly instead of checking first, a missing file is not an error
+            try:
+                fd = os.open(self.session_file, os.O_WRONLY)
+            except FileNotFoundError:
+                pass
+            else:
+                # Overwrite in place (no truncation) a page at a time, sized from the file itself
+                try:
+                    remaining = os.fstat(fd).st_size
+                    while remaining > 0:
+                        remaining -= os.write(fd, _ZERO_PAGE[:remaining])
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                Path(self.session_file).unlink(missing_ok=True)
                 logger.info("✅ Session file securely cleaned up")
                 
-            # Clear checksum
+            # Clear checksum and the cached session bytes
             self.session_checksum = None
+            self.__dict__.pop('_session_data', None)
             
         except Exception as e:
             logger.error(f"Error cleaning up session file: {e}")
@@ -169,139 +371,105 @@ class SecureSessionManager:
 class MessageParser:
     """Enhanced message parsing with better error handling and security"""
     
-    @staticmethod
-    def clean_text(text: str) -> str:
-        """Clean message text from watermarks and formatting with security checks"""
-        if not isinstance(text, str):
-            return ""
-        
-        # Remove watermarks
-        watermarks = [
-            '**🔹 ****t.me/breachdetector**** 🔹**',
-            't.me/breachdetector',
-            '**🔹',
-            '🔹**'
-        ]
-        
-        clean_text = text
-        for watermark in watermarks:
-            clean_text = clean_text.replace(watermark, '')
-        
-        # Handle escaped characters
-        clean_text = clean_text.replace('\\n', ' ').replace('\\"', '"')
-        
-        # Remove potentially dangerous characters
-        clean_text = re.sub(r'[<>"\']', '', clean_text)
-        
-        return clean_text.strip()
-    
-    @staticmethod
-    def parse_message_content(message_text: str) -> Optional[Dict[str, Any]]:
-        """Parse message content with enhanced error handling and validation"""
-        try:
-            if not isinstance(message_text, str):
-                return None
-                
-            clean_text = MessageParser.clean_text(message_text)
-            
-            # Validate content length
-            if len(clean_text) > MAX_CONTENT_LENGTH:
-                clean_text = clean_text[:MAX_CONTENT_LENGTH]
-            
-            # Try to parse as JSON
-            for attempt in range(2):
-                try:
-                    parsed = json.loads(clean_text)
-                    if isinstance(parsed, str):
-                        clean_text = parsed
-                        continue
-                    
-                    # Validate parsed JSON structure
-                    if isinstance(parsed, dict):
-                        # Ensure required fields exist
-                        if 'Content' not in parsed:
-                            parsed['Content'] = clean_text
-                        if 'Source' not in parsed:
-                            parsed['Source'] = 'Unknown'
-                        if 'Type' not in parsed:
-                            parsed['Type'] = 'Data leak'
-                        
-                        # Validate field types and lengths
-                        for key, value in parsed.items():
-                            if isinstance(value, str):
-                                if key == 'Content' and len(value) > MAX_CONTENT_LENGTH:
-                                    parsed[key] = value[:MAX_CONTENT_LENGTH]
-                                elif key == 'Source' and len(value) > MAX_SOURCE_LENGTH:
-                                    parsed[key] = value[:MAX_SOURCE_LENGTH]
-                    
-                    return parsed
-                except json.JSONDecodeError:
-                    break
-            
-            # If JSON parsing fails, return as plain text
-            return {"Content": clean_text, "Source": "Unknown", "Type": "Data leak"}
-            
-        except Exception as e:
-            logger.warning(f"Failed to parse message content: {e}")
-            return None
+    # Module-level functions, kept as static methods for existing callers
+    clean_text = staticmethod(clean_text)
+    parse_message_content = staticmethod(parse_message_content)
 
 class DataManager:
-    """Enhanced data management with backup and validation"""
+    """Enhanced data management with atomic saves and validation"""
     
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, base_dir: Path = Path('.')):
         self.config = config
-        self.data_file = 'data.json'
-        self.backup_file = 'data_backup.json'
+        self.data_file = base_dir / 'data.json'
+        self.max_seen_id = 0
         
+    def _read_records(self) -> Iterator[Dict[str, Any]]:
+        """Read stored messages one record at a time, tracking the newest message id"""
+        self.max_seen_id = 0
+        with open(self.data_file, 'rb') as f:
+            # ijson keeps only the current record in memory instead of the whole file
+            records = ijson.items(f, 'item', use_float=True) if ijson is not None else orjson.loads(f.read())
+            for record in records:
+                # Trust a stored fingerprint in the schema's 16-hex format, only legacy rows
+                # without one (or with an older composite id) are hashed
+                content = record.get('Content')
+                hash_id = record.get('hash_id')
+                if isinstance(content, str) and not (isinstance(hash_id, str) and _HASH_ID_RE.fullmatch(hash_id)):
+                    record['hash_id'] = content_hash(content)
+                
+                # Newest stored message, later fetches only ask for what came after it
+                message_id = record.get('message_id') or 0
+                if message_id > self.max_seen_id:
+                    self.max_seen_id = message_id
+                yield record
+    
+    async def iter_existing_data(self) -> AsyncIterator[Dict[str, Any]]:
+        """Stream existing messages, reading each chunk of records in a worker thread"""
+        records = self._read_records()
+        try:
+            while True:
+                chunk = await asyncio.to_thread(list, islice(records, LOAD_CHUNK_SIZE))
+                if not chunk:
+                    return
+                for record in chunk:
+                    yield record
+        finally:
+            records.close()
+    
     async def load_existing_data(self) -> List[Dict[str, Any]]:
         """Load existing data with error handling"""
         try:
-            async with aiofiles.open(self.data_file, 'r', encoding='utf-8') as f:
-                content = await f.read()
-                data = json.loads(content)
-                logger.info(f"Loaded {len(data)} existing messages")
-                return data
+            # Reads and parsing run in a worker thread so the event loop stays responsive
+            data = await asyncio.to_thread(list, self._read_records())
+            logger.info(f"Loaded {len(data)} existing messages")
+            return data
         except FileNotFoundError:
             logger.info("No existing data.json found, starting fresh")
             return []
         except Exception as e:
             logger.error(f"Error loading existing data: {e}")
+            self.max_seen_id = 0
             return []
     
-    async def save_data(self, messages: List[Dict[str, Any]], new_count: int):
-        """Save data with backup and validation"""
+    async def save_data(self, messages: Iterable[Dict[str, Any]], new_count: int):
+        """Save data atomically with validation"""
+        tmp_file = f"{self.data_file}.tmp"
         try:
-            # Create backup if enabled
-            if self.config.backup_enabled:
-                await self._create_backup()
-            
-            # Validate file size
-            if len(messages) > 10000:  # Prevent excessive growth
-                messages = messages[:10000]
-                logger.warning("Truncated to 10,000 messages to prevent excessive file size")
+            messages = list(messages)
+            if len(messages) > MAX_STORED_MESSAGES:
+                logger.warning(f"Truncated to {MAX_STORED_MESSAGES:,} messages to prevent excessive file size")
+                # deduplicate_messages already returns newest first, so the oldest rows are at the tail
+                messages = messages[:MAX_STORED_MESSAGES]
             
-            # Save to file
-            async with aiofiles.open(self.data_file, 'w', encoding='utf-8') as f:
-                await f.write(json.dumps(messages, indent=2, ensure_ascii=False))
+            # Serialize and write in a worker thread so the event loop stays responsive
+            await asyncio.to_thread(self._write_atomically, messages, tmp_file)
             
             logger.info(f"Saved {len(messages)} total messages (added {new_count} new)")
             
         except Exception as e:
             logger.error(f"Error saving data: {e}")
+            Path(tmp_file).unlink(missing_ok=True)
     
-    async def _create_backup(self):
-        """Create backup of current data"""
-        try:
-            if os.path.exists(self.data_file):
-                async with aiofiles.open(self.data_file, 'r', encoding='utf-8') as f:
-                    content = await f.read()
-                
-                async with aiofiles.open(self.backup_file, 'w', encoding='utf-8') as f:
-                    await f.write(content)
-                
-                logger.info("✅ Backup created")
-        except Exception as e:
-            logger.error(f"Error creating backup: {e}")
+    def _write_atomically(self, messages: List[Dict[str, Any]], tmp_file: str):
+        """Write messages to a temporary file and rename it over data.json, a crash never leaves it half-written"""
+        with open(tmp_file, 'wb') as f:
+            if not messages:
+                f.write(b'[]\n')
+            else:
+                f.write(b'[\n')
+                # orjson holds the GIL, so records are encoded in chunks to let the event loop run in between
+                for start in range(0, len(messages), SAVE_CHUNK_SIZE):
+                    if start:
+                        f.write(b',\n')
+                    # Indent each record one level, matching orjson's OPT_INDENT_2 array layout
+                    f.write(b',\n'.join(
+                        b'  ' + orjson.dumps(record, option=orjson.OPT_INDENT_2).replace(b'\n', b'\n  ')
+                        for record in messages[start:start + SAVE_CHUNK_SIZE]
+                    ))
+                f.write(b'\n]\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.data_file)
 
 class TelegramFetcher:
     """Enhanced Telegram message fetcher with retry logic and security"""
@@ -360,25 +528,26 @@ class TelegramFetcher:
             else:
                 await client.start()
             
-            logger.info(f"Fetching messages from @{self.config.channel}...")
+            # Message ids are per channel, so the stored maximum only applies to a single channel
+            channels = self.config.channels
+            min_id = self.data_manager.max_seen_id if len(channels) == 1 else 0
             
-            # Get channel entity
-            try:
-                channel = await client.get_entity(f"@{self.config.channel}")
-            except Exception as e:
-                logger.error(f"Could not find channel @{self.config.channel}: {e}")
-                return []
+            # Fetch channels concurrently, the semaphore caps parallel requests
+            semaphore = asyncio.Semaphore(self.config.max_concurrent_fetches)
+            results = await asyncio.gather(
+                *(self._fetch_channel(client, name, min_id, semaphore) for name in channels),
+                return_exceptions=True
+            )
             
-            # Fetch messages with quality filtering
-            all_messages = []
-            async for message in client.iter_messages(channel, limit=self.config.message_limit):
-                if message.text:
-                    parsed_content = self.parser.parse_message_content(message.text)
-                    if parsed_content and DataProcessor.validate_message_structure(parsed_content):
-                        # Add message metadata
-                        parsed_content['message_id'] = message.id
-                        parsed_content['timestamp'] = message.date.isoformat()
-                        all_messages.append(parsed_content)
+            raw_messages = []
+            for name, result in zip(channels, results):
+                if isinstance(result, BaseException):
+                    logger.error(f"Could not fetch channel @{name}: {result}")
+                    continue
+                raw_messages.extend(result)
+            
+            # Parse and validate the batch in a worker thread
+            all_messages = await asyncio.to_thread(self._parse_batch, raw_messages)
             
             logger.info(f"Fetched {len(all_messages)} valid messages")
             await client.disconnect()
@@ -396,96 +565,117 @@ class TelegramFetcher:
         finally:
             if is_github_actions:
                 self.session_manager.cleanup_session_file()
+    
+    async def _fetch_channel(self, client: TelegramClient, name: str, min_id: int,
+                             semaphore: asyncio.Semaphore) -> List[tuple]:
+        """Collect raw (id, date, text) tuples from one channel"""
+        async with semaphore:
+            logger.info(f"Fetching messages from @{name}...")
+            channel = await client.get_entity(f"@{name}")
+            
+            # Only collect raw fields while receiving, parsing happens off the event loop
+            # min_id skips messages already stored, the limit stays as a safety cap
+            raw_messages = []
+            async for message in client.iter_messages(channel, limit=self.config.message_limit,
+                                                      min_id=min_id):
+                if message.text:
+                    raw_messages.append((message.id, message.date, message.text))
+            return raw_messages
+    
+    def _parse_batch(self, raw_messages: List[tuple]) -> List[Dict[str, Any]]:
+        """Parse and validate raw (id, date, text) tuples with quality filtering"""
+        all_messages = []
+        for message_id, date, text in raw_messages:
+            parsed_content = parse_message_content(text)
+            if parsed_content and validate_message_structure(parsed_content):
+                # Add message metadata
+                parsed_content['message_id'] = message_id
+                parsed_content['timestamp'] = date.isoformat()
+                parsed_content['hash_id'] = content_hash(parsed_content['Content'])
+                all_messages.append(parsed_content)
+        return all_messages
 
 class DataProcessor:
     """Enhanced data processing with deduplication and validation"""
     
-    # Keywords that indicate actual breaches vs spam/ads
-    BREACH_INDICATORS = [
-        'leak', 'breach', 'hack', 'compromise', 'exposed', 'stolen', 'database',
-        'credentials', 'password', 'email', 'personal data', 'user data',
-        'customer data', 'financial data', 'credit card', 'ssn', 'social security'
-    ]
-    
-    SPAM_INDICATORS = [
-        'buy', 'sell', 'offer', 'discount', 'promotion', 'service', 'tool',
-        'software', 'review', 'rating', 'backlink', 'seo', 'marketing',
-        'advertisement', 'sponsored', 'deal', 'sale', 'free trial'
-    ]
+    # Module-level functions, kept as static methods for existing callers
+    is_legitimate_breach = staticmethod(is_legitimate_breach)
+    validate_message_structure = staticmethod(validate_message_structure)
     
     @staticmethod
-    def is_legitimate_breach(content: str) -> bool:
-        """Check if content represents a legitimate breach vs spam/ad"""
-        if not content:
-            return False
-            
-        content_lower = content.lower()
-        
-        # Check for spam indicators
-        spam_score = sum(1 for indicator in DataProcessor.SPAM_INDICATORS 
-                        if indicator in content_lower)
+    def deduplicate_messages(existing: Iterable[Dict[str, Any]], new: Iterable[Dict[str, Any]],
+                             executor: Optional[Executor] = None) -> List[Dict[str, Any]]:
+        """Deduplicate messages using their cached hash_id with quality filtering, newest first"""
+        if executor is not None:
+            unique = DataProcessor._iter_unique_sharded(existing, new, executor)
+        else:
+            unique = DataProcessor._iter_unique(existing, new)
         
-        # Check for breach indicators
-        breach_score = sum(1 for indicator in DataProcessor.BREACH_INDICATORS 
-                          if indicator in content_lower)
+        # data.json and iter_messages both run newest first, so the cap keeps the
+        # newest rows by timestamp rather than by arrival order
+        unique_messages = newest_first(unique, MAX_STORED_MESSAGES)
         
-        # Content is legitimate if it has more breach indicators than spam
-        return breach_score > spam_score and breach_score > 0
+        logger.info(f"Filtered to {len(unique_messages)} legitimate breach messages")
+        return unique_messages
     
     @staticmethod
-    def deduplicate_messages(existing: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Deduplicate messages using content hash with quality filtering"""
+    def _iter_unique(existing: Iterable[Dict[str, Any]], new: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Yield the first legitimate occurrence of each fingerprint"""
         seen_hashes = set()
-        unique_messages = []
         
-        # Process existing messages
-        for msg in existing:
-            content = msg.get('Content', '').strip()
-            if content and DataProcessor.is_legitimate_breach(content):
-                content_hash = hashlib.sha256(content.encode()).hexdigest()[:16]
-                if content_hash not in seen_hashes:
-                    seen_hashes.add(content_hash)
-                    unique_messages.append(msg)
+        # Bind hot-loop lookups once instead of resolving them per message
+        seen_add = seen_hashes.add
+        is_legitimate = is_legitimate_breach
         
-        # Process new messages
-        for msg in new:
+        for msg in chain(existing, new):
             content = msg.get('Content', '').strip()
-            if content and DataProcessor.is_legitimate_breach(content):
-                content_hash = hashlib.sha256(content.encode()).hexdigest()[:16]
-                if content_hash not in seen_hashes:
-                    seen_hashes.add(content_hash)
-                    unique_messages.append(msg)
-        
-        logger.info(f"Filtered to {len(unique_messages)} legitimate breach messages")
-        return unique_messages
+            if not content:
+                continue
+            
+            # Parsed rows carry a fresh fingerprint and stored rows keep theirs from load;
+            # rows without one are hashed once and keep it
+            hash_id = msg.get('hash_id')
+            if not hash_id:
+                hash_id = msg['hash_id'] = content_hash(content)
+            if hash_id in seen_hashes:
+                continue
+            
+            # Duplicates share content, so each fingerprint is classified once
+            seen_add(hash_id)
+            if is_legitimate(content):
+                yield msg
     
     @staticmethod
-    def validate_message_structure(message: Dict[str, Any]) -> bool:
-        """Validate message structure with enhanced checks"""
-        required_fields = ['Content']
-        
-        # Check required fields exist
-        if not all(field in message for field in required_fields):
-            return False
+    def _iter_unique_sharded(existing: Iterable[Dict[str, Any]], new: Iterable[Dict[str, Any]],
+                             executor: Executor) -> Iterator[Dict[str, Any]]:
+        """Classify shards on the executor, then merge them in order like the serial pass"""
+        messages = list(chain(existing, new))
+        shards = [messages[start:start + DEDUP_SHARD_SIZE] for start in range(0, len(messages), DEDUP_SHARD_SIZE)]
+        classified = chain.from_iterable(executor.map(classify_messages, shards))
         
-        # Check content is not empty
-        content = message.get('Content', '').strip()
-        if not content:
-            return False
-        
-        # Check content length
-        if len(content) > MAX_CONTENT_LENGTH:
-            return False
+        seen_hashes = set()
+        seen_add = seen_hashes.add
         
-        # Check if it's a legitimate breach
-        return DataProcessor.is_legitimate_breach(content)
+        # The first occurrence of a fingerprint wins, exactly as in the serial pass
+        for msg, result in zip(messages, classified):
+            if result is None:
+                continue
+            hash_id, legitimate = result
+            if not msg.get('hash_id'):
+                msg['hash_id'] = hash_id  # Workers hashed a copy, keep it on the original row
+            if hash_id in seen_hashes:
+                continue
+            seen_add(hash_id)
+            if legitimate:
+                yield msg
 
 async def main():
     """Main function with enhanced error handling"""
+    configure_logging('telegram_fetcher.log')
     logger.info("Starting enhanced Telegram channel fetch...")
     
     # Initialize configuration
-    config = Config()
+    config = Config.from_env()
     if not config.validate():
         return
     
@@ -494,13 +684,13 @@ async def main():
     processor = DataProcessor()
     
     try:
+        # Load existing data first so the fetch can start after the newest stored message
+        existing_messages = await fetcher.data_manager.load_existing_data()
+        
         # Fetch new messages
         new_messages = await fetcher.fetch_messages_with_retry()
         
         if new_messages:
-            # Load existing data
-            existing_messages = await fetcher.data_manager.load_existing_data()
-            
             # Deduplicate and combine
             all_messages = processor.deduplicate_messages(existing_messages, new_messages)
             
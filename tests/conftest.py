@@ -0,0 +1,86 @@
+import asyncio
+import base64
+
+import pytest
+
+import fetch_secure_session_improved as fetcher_module
+from fetch_secure_session_improved import Config
+
+@pytest.fixture(scope="session")
+def config():
+    """Configuration built once from test credentials"""
+    return Config(api_id='12345', api_hash='abcdef1234567890abcdef1234567890')
+
+@pytest.fixture
+def telegram_env(monkeypatch):
+    """Test credentials in the environment, with no CI session or overrides leaking in"""
+    monkeypatch.setenv('API_ID', '12345')
+    monkeypatch.setenv('API_HASH', 'abcdef1234567890abcdef1234567890')
+    for name in ('GITHUB_ACTIONS', 'TELEGRAM_SESSION_BASE64', 'CHANNEL', 'MESSAGE_LIMIT'):
+        monkeypatch.delenv(name, raising=False)
+
+@pytest.fixture
+def tmp_cwd(tmp_path, monkeypatch):
+    """Run the test from an empty temporary working directory"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture(scope="module")
+def session_b64():
+    """Base64 session string shared by the session manager tests"""
+    return "dGVzdF9zZXNzaW9uX2RhdGE="
+
+@pytest.fixture(scope="module")
+def session_data(session_b64):
+    """Raw session bytes, decoded once per module"""
+    return base64.b64decode(session_b64)
+
+class FakeTelethonClient:
+    """Minimal async stand-in for the TelegramClient calls the fetcher makes"""
+    
+    def __init__(self):
+        # A list served for every channel, or a callable taking the channel entity
+        self.messages = []
+        self.latency = 0.0
+        self.entity_error = None
+        self.requests = []
+        # Channel requests currently waiting on latency, and the most seen at once
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    async def connect(self):
+        pass
+    
+    async def start(self):
+        return self
+    
+    async def disconnect(self):
+        pass
+    
+    async def is_user_authorized(self):
+        return True
+    
+    async def get_entity(self, name):
+        if self.entity_error:
+            raise self.entity_error
+        return name.lstrip('@')
+    
+    async def iter_messages(self, entity, limit=100, min_id=0):
+        self.requests.append({'entity': entity, 'limit': limit, 'min_id': min_id})
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        messages = self.messages(entity) if callable(self.messages) else self.messages
+        for message in messages:
+            yield message
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    """Fake Telegram client returned by every TelegramClient(...) call in the fetcher"""
+    client = FakeTelethonClient()
+    monkeypatch.setattr(fetcher_module, 'TelegramClient', lambda *args, **kwargs: client)
+    return client
@@ -1,59 +1,69 @@
 import pytest
 import asyncio
-import json
-import tempfile
+import base64
+import orjson
 import os
-from unittest.mock import Mock, patch, AsyncMock
-from datetime import datetime
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+from datetime import datetime, timezone, timedelta
 
 # Import the classes we want to test
+import fetch_secure_session_improved as fetcher_module
 from fetch_secure_session_improved import (
     Config, SecureSessionManager, MessageParser, 
-    DataManager, DataProcessor, TelegramFetcher
+    DataManager, DataProcessor, TelegramFetcher, content_hash
 )
 
+# Fixed message date so runs are reproducible and never read the clock
+FROZEN_TS = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+@pytest.mark.usefixtures("telegram_env")
 class TestConfig:
     """Test configuration management"""
     
-    def test_config_validation_success(self):
-        """Test successful configuration validation"""
-        with patch.dict(os.environ, {
-            'API_ID': '12345',
-            'API_HASH': 'abcdef1234567890abcdef1234567890'
-        }):
-            config = Config()
-            assert config.validate() is True
-    
-    def test_config_validation_missing_credentials(self):
-        """Test configuration validation with missing credentials"""
-        with patch.dict(os.environ, {}, clear=True):
-            config = Config()
-            assert config.validate() is False
-    
-    def test_config_validation_invalid_api_id(self):
-        """Test configuration validation with invalid API ID"""
-        with patch.dict(os.environ, {
-            'API_ID': 'invalid',
-            'API_HASH': 'abcdef1234567890abcdef1234567890'
-        }):
-            config = Config()
-            assert config.validate() is False
+    @pytest.mark.parametrize("api_id,api_hash,expected", [
+        ('12345', 'abcdef1234567890abcdef1234567890', True),
+        (None, None, False),  # Missing credentials
+        ('invalid', 'abcdef1234567890abcdef1234567890', False),  # Non-numeric API ID
+    ])
+    def test_config_validation(self, api_id, api_hash, expected):
+        """Test configuration validation"""
+        config = Config(api_id=api_id, api_hash=api_hash)
+        assert config.validate() is expected
+    
+    def test_config_from_env(self, monkeypatch):
+        """Test building configuration from environment variables"""
+        monkeypatch.setenv('CHANNEL', 'alpha, bravo')
+        monkeypatch.setenv('MESSAGE_LIMIT', '250')
+        config = Config.from_env()
+        
+        assert config.api_id == '12345'
+        assert config.channels == ['alpha', 'bravo']
+        assert config.message_limit == 250
+        assert config.validate() is True
 
 class TestSecureSessionManager:
     """Test secure session management"""
     
-    def test_create_session_file_success(self):
+    def test_create_session_file_success(self, session_b64, tmp_cwd):
         """Test successful session file creation"""
-        session_data = b"test_session_data"
-        session_base64 = "dGVzdF9zZXNzaW9uX2RhdGE="  # base64 of test_session_data
-        
-        with patch('os.getenv', return_value=session_base64):
-            manager = SecureSessionManager(session_base64)
+        with patch('os.getenv', return_value=session_b64):
+            manager = SecureSessionManager(session_b64)
             
-            with tempfile.TemporaryDirectory():
-                result = manager.create_session_file()
-                assert result is True
-                assert os.path.exists('telegram_session.session')
+            result = manager.create_session_file()
+            assert result is True
+            assert os.path.exists('telegram_session.session')
+    
+    def test_create_session_file_invalid_base64(self):
+        """Test session file creation with malformed base64"""
+        manager = SecureSessionManager("not base64!")
+        result = manager.create_session_file()
+        assert result is False
     
     def test_create_session_file_missing_data(self):
         """Test session file creation with missing data"""
@@ -61,18 +71,70 @@ class TestSecureSessionManager:
         result = manager.create_session_file()
         assert result is False
     
-    def test_cleanup_session_file(self):
+    def test_cleanup_session_file(self, session_b64, tmp_cwd):
         """Test session file cleanup"""
-        session_base64 = "dGVzdF9zZXNzaW9uX2RhdGE="
-        manager = SecureSessionManager(session_base64)
+        manager = SecureSessionManager(session_b64)
         
-        with tempfile.TemporaryDirectory():
-            # Create a dummy session file
-            with open('telegram_session.session', 'w') as f:
-                f.write('test')
-            
+        # Create a dummy session file
+        with open('telegram_session.session', 'w') as f:
+            f.write('test')
+        
+        manager.cleanup_session_file()
+        assert not os.path.exists('telegram_session.session')
+    
+    def test_cleanup_session_file_wipes_whole_file(self, session_b64, tmp_cwd):
+        """Test that cleanup zeroes the file at its current size before unlinking it"""
+        manager = SecureSessionManager(session_b64)
+        assert manager.create_session_file() is True
+        with open('telegram_session.session', 'ab') as f:
+            f.write(b'\xff' * 10000)  # Grown past the created size and several pages
+        size = os.path.getsize('telegram_session.session')
+        
+        written = []
+        real_unlink = Path.unlink
+        def capture(path, missing_ok=False):
+            written.append(path.read_bytes())
+            real_unlink(path, missing_ok=missing_ok)
+        
+        with patch.object(Path, 'unlink', capture):
             manager.cleanup_session_file()
-            assert not os.path.exists('telegram_session.session')
+        
+        assert written == [b'\x00' * size]
+        assert not os.path.exists('telegram_session.session')
+    
+    def test_cleanup_session_file_absent(self, session_b64, tmp_cwd, caplog):
+        """Test that cleanup without a session file is a silent no-op"""
+        manager = SecureSessionManager(session_b64)
+        assert manager.create_session_file() is True
+        os.unlink('telegram_session.session')
+        
+        manager.cleanup_session_file()  # No file present; must not raise or log an error
+        assert manager.session_checksum is None
+        assert not [record for record in caplog.records if record.levelname == 'ERROR']
+    
+    def test_create_session_file_permissions(self, session_b64, session_data, tmp_cwd):
+        """Test that the session file is written owner-only with the decoded data"""
+        manager = SecureSessionManager(session_b64)
+        
+        assert manager.create_session_file() is True
+        assert os.stat('telegram_session.session').st_mode & 0o777 == 0o600
+        with open('telegram_session.session', 'rb') as f:
+            assert f.read() == session_data
+        
+        manager.cleanup_session_file()
+        assert not os.path.exists('telegram_session.session')
+    
+    def test_create_session_file_decodes_once(self, session_b64, session_data, tmp_cwd):
+        """Test that repeated session file creation reuses the decoded bytes"""
+        manager = SecureSessionManager(session_b64)
+        
+        with patch('base64.b64decode', wraps=base64.b64decode) as decode:
+            assert manager.create_session_file() is True
+            assert manager.create_session_file() is True
+        
+        assert decode.call_count == 1
+        with open('telegram_session.session', 'rb') as f:
+            assert f.read() == session_data
 
 class TestMessageParser:
     """Test message parsing functionality"""
@@ -85,6 +147,21 @@ class TestMessageParser:
         assert "🔹" not in cleaned
         assert "Test message with watermarks" in cleaned
     
+    @pytest.mark.benchmark(group="clean_text")
+    def test_clean_text_bulk(self, request):
+        """Benchmark cleaning a large batch of messages, compare runs with --benchmark-autosave"""
+        pytest.importorskip("pytest_benchmark")
+        benchmark = request.getfixturevalue("benchmark")
+        messages = [
+            f"**🔹 ****t.me/breachdetector**** 🔹** Breach {i}: example.com leaked <1.2M> user records"
+            for i in range(100000)
+        ]
+        
+        cleaned = benchmark.pedantic(
+            lambda: [MessageParser.clean_text(message) for message in messages], rounds=5
+        )
+        assert cleaned[0] == "Breach 0: example.com leaked 1.2M user records"
+    
     def test_parse_message_content_json(self):
         """Test parsing JSON message content"""
         json_content = '{"Source": "test.com", "Content": "Test breach", "Type": "Data leak"}'
@@ -93,6 +170,38 @@ class TestMessageParser:
         assert result["Content"] == "Test breach"
         assert result["Type"] == "Data leak"
     
+    def test_parse_message_content_encoded_json(self):
+        """Test that string-encoded JSON is decoded and its fields are scrubbed"""
+        encoded = orjson.dumps('{"Source": "test.com", "Content": "Test <b>breach</b>", "extra": 1}').decode()
+        result = MessageParser.parse_message_content(encoded)
+        assert result == {"Source": "test.com", "Content": "Test bbreach/b", "Type": "Data leak"}
+    
+    def test_parse_message_content_watermarked_json(self):
+        """Test that watermarks around a JSON post are stripped before decoding"""
+        post = '**🔹 {"Source": "test.com", "Content": "Test breach\\nt.me/breachdetector"}\n**🔹 ****t.me/breachdetector**** 🔹**'
+        result = MessageParser.parse_message_content(post)
+        assert result == {"Source": "test.com", "Content": "Test breach", "Type": "Data leak"}
+    
+    def test_parse_message_content_normalizes_schema_fields(self):
+        """Test that an out-of-enum Type becomes Other and author is capped"""
+        post = orjson.dumps({"Source": "test.com", "Content": "Test breach", "Type": "Credential dump",
+                             "author": "a" * 150}).decode()
+        result = MessageParser.parse_message_content(post)
+        assert result["Type"] == "Other"
+        assert result["author"] == "a" * fetcher_module.MAX_AUTHOR_LENGTH
+    
+    @pytest.mark.parametrize("fields, expected", [
+        ({"severity": "high", "affected_count": 1200, "data_types": ["emails", "passwords"]},
+         {"severity": "high", "affected_count": 1200, "data_types": ["emails", "passwords"]}),
+        ({"severity": "severe", "affected_count": -1, "data_types": ["emails", "phone numbers"]},
+         {"data_types": ["emails", "other"]}),
+    ])
+    def test_parse_message_content_optional_fields(self, fields, expected):
+        """Test that optional schema fields are kept and out-of-schema values dropped or mapped"""
+        post = orjson.dumps({"Source": "test.com", "Content": "Test breach", **fields}).decode()
+        result = MessageParser.parse_message_content(post)
+        assert result == {"Source": "test.com", "Content": "Test breach", "Type": "Data leak", **expected}
+    
     def test_parse_message_content_plain_text(self):
         """Test parsing plain text message content"""
         text_content = "Simple breach message"
@@ -100,6 +209,11 @@ class TestMessageParser:
         assert result["Content"] == "Simple breach message"
         assert result["Source"] == "Unknown"
         assert result["Type"] == "Data leak"
+    
+    def test_parse_message_content_numeric_text(self):
+        """Test that bare JSON scalars are kept as plain text"""
+        result = MessageParser.parse_message_content("12345")
+        assert result == {"Content": "12345", "Source": "Unknown", "Type": "Data leak"}
 
 class TestDataProcessor:
     """Test data processing functionality"""
@@ -122,126 +236,375 @@ class TestDataProcessor:
         assert "Test breach 2" in contents
         assert "Test breach 3" in contents
     
-    def test_validate_message_structure_valid(self):
-        """Test valid message structure validation"""
-        message = {"Content": "Test breach", "Source": "test.com", "Type": "Data leak"}
-        assert DataProcessor.validate_message_structure(message) is True
+    def test_deduplicate_messages_reuses_hash_id(self):
+        """Test that a cached hash_id matches the one computed for legacy rows"""
+        existing = [{"Content": "Test breach 1", "Source": "test.com"}]
+        new = [{
+            "Content": "Test breach 1", "Source": "test.com",
+            "hash_id": content_hash("Test breach 1")
+        }]
+        
+        result = DataProcessor.deduplicate_messages(existing, new)
+        assert len(result) == 1
+        assert len(content_hash("Test breach 1")) == 16
+        # Legacy rows keep the computed hash so later runs skip re-encoding
+        assert existing[0]["hash_id"] == new[0]["hash_id"]
     
-    def test_validate_message_structure_invalid(self):
-        """Test invalid message structure validation"""
-        message = {"Source": "test.com", "Type": "Data leak"}  # Missing Content
-        assert DataProcessor.validate_message_structure(message) is False
+    def test_deduplicate_messages_collision_safe(self):
+        """Test that near-identical messages keep distinct fingerprints"""
+        # Contents differing by a single character at either end
+        existing = [{"Content": f"Test breach {i} " + "x" * 2000, "Source": "test.com"} for i in range(5000)]
+        new = [{"Content": "x" * 2000 + f" Test breach {i}", "Source": "test.com"} for i in range(5000)]
+        repost = [{"Content": existing[0]["Content"], "Source": "other.com"}]
         
-        message = {"Content": "", "Source": "test.com"}  # Empty Content
-        assert DataProcessor.validate_message_structure(message) is False
+        result = DataProcessor.deduplicate_messages(existing, new + repost)
+        assert len(result) == 10000
+        assert len({msg["hash_id"] for msg in result}) == 10000
+        # Fingerprints cover Content only, so a repost from another source is a duplicate
+        assert all(msg["Source"] == "test.com" for msg in result)
+    
+    @pytest.mark.parametrize("message,expected", [
+        ({"Content": "Test breach", "Source": "test.com", "Type": "Data leak"}, True),
+        ({"Source": "test.com", "Type": "Data leak"}, False),  # Missing Content
+        ({"Content": "", "Source": "test.com"}, False),  # Empty Content
+    ])
+    def test_validate_message_structure(self, message, expected):
+        """Test message structure validation"""
+        assert DataProcessor.validate_message_structure(message) is expected
 
 @pytest.mark.asyncio
 class TestDataManager:
     """Test data management functionality"""
     
-    async def test_load_existing_data_success(self):
+    async def test_load_existing_data_success(self, config, tmp_path):
         """Test successful loading of existing data"""
         test_data = [{"Content": "Test breach", "Source": "test.com"}]
         
-        with tempfile.TemporaryDirectory() as temp_dir:
-            os.chdir(temp_dir)
-            
-            # Create test data file
-            with open('data.json', 'w') as f:
-                json.dump(test_data, f)
-            
-            config = Config()
-            manager = DataManager(config)
-            result = await manager.load_existing_data()
-            
-            assert result == test_data
+        # Create test data file
+        (tmp_path / 'data.json').write_bytes(orjson.dumps(test_data))
+        
+        manager = DataManager(config, base_dir=tmp_path)
+        result = await manager.load_existing_data()
+        
+        # Rows come back with a current fingerprint
+        assert result == [{**test_data[0], "hash_id": content_hash("Test breach")}]
+        assert manager.max_seen_id == 0
+    
+    async def test_load_existing_data_tracks_max_seen_id(self, config, tmp_path):
+        """Test that loading records the newest stored message id"""
+        test_data = [
+            {"Content": "Test breach 1", "Source": "test.com", "message_id": 41},
+            {"Content": "Test breach 2", "Source": "test.com", "message_id": 57},
+            {"Content": "Legacy breach", "Source": "test.com"}
+        ]
+        
+        (tmp_path / 'data.json').write_bytes(orjson.dumps(test_data))
+        
+        manager = DataManager(config, base_dir=tmp_path)
+        await manager.load_existing_data()
+        
+        assert manager.max_seen_id == 57
+    
+    async def test_load_existing_data_streaming_large(self, config, tmp_path):
+        """Test that iterating a large data file keeps memory bounded"""
+        pytest.importorskip("ijson")
+        record_count = 100000
+        
+        # Write a ~50 MB JSON array without building it in memory
+        with open(tmp_path / 'data.json', 'wb') as f:
+            f.write(b'[')
+            for i in range(record_count):
+                if i:
+                    f.write(b',')
+                f.write(orjson.dumps({
+                    "Content": f"Test breach {i} " + "x" * 450,
+                    "Source": "test.com",
+                    "message_id": i
+                }))
+            f.write(b']')
+        
+        manager = DataManager(config, base_dir=tmp_path)
+        count = 0
+        tracemalloc.start()
+        try:
+            async for record in manager.iter_existing_data():
+                count += 1
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        
+        assert count == record_count
+        assert manager.max_seen_id == record_count - 1
+        assert peak < 5 * 1024 * 1024
+    
+    async def test_load_existing_data_does_not_block_event_loop(self, config, tmp_path, monkeypatch):
+        """Test that the event loop keeps running callbacks while data.json is read"""
+        test_data = [
+            {"Content": f"Test breach {i}", "Source": "test.com", "message_id": i}
+            for i in range(100)
+        ]
+        (tmp_path / 'data.json').write_bytes(orjson.dumps(test_data))
+        loop = asyncio.get_running_loop()
+        loop_ran = []
+        
+        manager = DataManager(config, base_dir=tmp_path)
+        read_records = manager._read_records
+        
+        def probed_read():
+            # On the event loop thread this callback could only run after the read finished
+            event = threading.Event()
+            loop.call_soon_threadsafe(event.set)
+            loop_ran.append(event.wait(timeout=5))
+            yield from read_records()
+        
+        monkeypatch.setattr(manager, "_read_records", probed_read)
+        result = await manager.load_existing_data()
+        
+        assert loop_ran == [True]
+        assert len(result) == 100
+        assert manager.max_seen_id == 99
+    
+    async def test_load_existing_data_keeps_stored_hash_id(self, config, tmp_path, monkeypatch):
+        """Test that a stored fingerprint is reused through load and dedup without hashing again"""
+        hash_id = content_hash("Test breach 1")
+        (tmp_path / 'data.json').write_bytes(orjson.dumps([
+            {"Content": "Test breach 1", "Source": "test.com", "hash_id": hash_id}
+        ]))
+        hasher = Mock(wraps=content_hash)
+        monkeypatch.setattr(fetcher_module, "content_hash", hasher)
+        
+        manager = DataManager(config, base_dir=tmp_path)
+        existing = await manager.load_existing_data()
+        result = DataProcessor.deduplicate_messages(existing, [])
+        
+        assert result[0]["hash_id"] == hash_id
+        hasher.assert_not_called()
+    
+    @pytest.mark.parametrize("legacy_row", [
+        {},
+        {"hash_id": "test.com_0123456789abcdef"},  # Composite id from older BreachEntry rows
+    ])
+    async def test_load_existing_data_rehashes_legacy_ids(self, config, tmp_path, legacy_row):
+        """Test that rows without a 16-hex fingerprint are hashed so re-fetched posts still deduplicate"""
+        (tmp_path / 'data.json').write_bytes(orjson.dumps([
+            {"Content": "Test breach 1", "Source": "test.com", **legacy_row}
+        ]))
+        
+        manager = DataManager(config, base_dir=tmp_path)
+        existing = await manager.load_existing_data()
+        assert existing[0]["hash_id"] == content_hash("Test breach 1")
+        
+        new = [{"Content": "Test breach 1 ", "Source": "test.com", "hash_id": content_hash("Test breach 1 ")}]
+        assert len(DataProcessor.deduplicate_messages(existing, new)) == 1
     
-    async def test_load_existing_data_file_not_found(self):
+    async def test_load_existing_data_file_not_found(self, config, tmp_path):
         """Test loading when data file doesn't exist"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            os.chdir(temp_dir)
-            
-            config = Config()
-            manager = DataManager(config)
-            result = await manager.load_existing_data()
-            
-            assert result == []
+        manager = DataManager(config, base_dir=tmp_path)
+        result = await manager.load_existing_data()
+        
+        assert result == []
     
-    async def test_save_data_success(self):
+    async def test_save_data_success(self, config, tmp_path):
         """Test successful data saving"""
         test_data = [{"Content": "Test breach", "Source": "test.com"}]
         
-        with tempfile.TemporaryDirectory() as temp_dir:
-            os.chdir(temp_dir)
-            
-            config = Config()
-            manager = DataManager(config)
-            await manager.save_data(test_data, 1)
-            
-            # Verify file was created
-            assert os.path.exists('data.json')
-            
-            # Verify content
-            with open('data.json', 'r') as f:
-                saved_data = json.load(f)
-            assert saved_data == test_data
+        manager = DataManager(config, base_dir=tmp_path)
+        await manager.save_data(test_data, 1)
+        
+        # Verify file was created
+        assert (tmp_path / 'data.json').exists()
+        
+        # Verify content
+        saved_data = orjson.loads((tmp_path / 'data.json').read_bytes())
+        assert saved_data == test_data
+    
+    async def test_save_data_keeps_unicode(self, config, tmp_path):
+        """Test that non-ASCII content is written as UTF-8, not escaped"""
+        test_data = [{"Content": "Утечка базы 🔹", "Source": "test.com"}]
+        
+        manager = DataManager(config, base_dir=tmp_path)
+        await manager.save_data(test_data, 1)
+        
+        raw = (tmp_path / 'data.json').read_bytes()
+        assert "Утечка базы 🔹".encode('utf-8') in raw
+        assert orjson.loads(raw) == test_data
+    
+    async def test_save_data_replaces_atomically(self, config, tmp_path):
+        """Test that saving replaces data.json without leaving a temporary file"""
+        old_data = [{"Content": "Old breach", "Source": "test.com"}]
+        new_data = [{"Content": "New breach", "Source": "test.com"}]
+        
+        (tmp_path / 'data.json').write_bytes(orjson.dumps(old_data))
+        
+        manager = DataManager(config, base_dir=tmp_path)
+        await manager.save_data(new_data, 1)
+        
+        assert orjson.loads((tmp_path / 'data.json').read_bytes()) == new_data
+        assert not (tmp_path / 'data.json.tmp').exists()
+    
+    async def test_save_data_keeps_newest(self, config, tmp_path, monkeypatch, caplog):
+        """Test that saving over the cap keeps the newest rows without sorting them again"""
+        test_data = DataProcessor.deduplicate_messages([], [
+            {"Content": f"Test breach {i}", "Source": "test.com", "message_id": i,
+             "timestamp": (FROZEN_TS + timedelta(minutes=i)).isoformat()}
+            for i in (2, 4, 1, 5, 3)
+        ])
+        monkeypatch.setattr(fetcher_module, "MAX_STORED_MESSAGES", 3)
+        monkeypatch.setattr(fetcher_module, "newest_first", Mock(side_effect=AssertionError("re-sorted")))
+        
+        manager = DataManager(config, base_dir=tmp_path)
+        await manager.save_data(test_data, 0)
+        
+        saved = orjson.loads((tmp_path / 'data.json').read_bytes())
+        assert [msg["message_id"] for msg in saved] == [5, 4, 3]
+        assert "Truncated to 3 messages" in caplog.text
+    
+    async def test_save_data_does_not_block_event_loop(self, config, tmp_path, monkeypatch):
+        """Test that the event loop keeps running callbacks while data.json is written"""
+        test_data = [
+            {"Content": f"Test breach {i}", "Source": "test.com", "message_id": i}
+            for i in reversed(range(100))
+        ]
+        loop = asyncio.get_running_loop()
+        loop_ran = []
+        
+        manager = DataManager(config, base_dir=tmp_path)
+        write_atomically = manager._write_atomically
+        
+        def probed_write(*args):
+            # On the event loop thread this callback could only run after the write returned
+            event = threading.Event()
+            loop.call_soon_threadsafe(event.set)
+            loop_ran.append(event.wait(timeout=5))
+            return write_atomically(*args)
+        
+        monkeypatch.setattr(manager, "_write_atomically", probed_write)
+        await manager.save_data(test_data, 0)
+        
+        assert loop_ran == [True]
+        # Same bytes as a single orjson.dumps call would produce
+        assert (tmp_path / 'data.json').read_bytes() == orjson.dumps(
+            test_data, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE
+        )
+    
+    async def test_save_data_streams_large(self, config, tmp_path, monkeypatch):
+        """Test that saving 100k records writes chunk by chunk with bounded memory"""
+        record_count = 100000
+        monkeypatch.setattr(fetcher_module, "MAX_STORED_MESSAGES", record_count)
+        test_data = [
+            {"Content": f"Test breach {i} " + "x" * 450, "Source": "test.com", "message_id": i}
+            for i in reversed(range(record_count))
+        ]
+        
+        manager = DataManager(config, base_dir=tmp_path)
+        tracemalloc.start()
+        try:
+            await manager.save_data(test_data, 0)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        
+        # The ~50 MB array is never materialized as a single bytes object
+        assert peak < 10 * 1024 * 1024
+        assert orjson.loads((tmp_path / 'data.json').read_bytes()) == test_data
 
 @pytest.mark.asyncio
+@pytest.mark.usefixtures("telegram_env")
 class TestTelegramFetcher:
     """Test Telegram fetcher functionality"""
     
-    @patch('telethon.TelegramClient')
-    async def test_fetch_messages_success(self, mock_client):
+    async def test_fetch_messages_success(self, fake_client, session_b64, tmp_cwd, monkeypatch):
         """Test successful message fetching"""
-        # Mock client setup
-        mock_client_instance = AsyncMock()
-        mock_client.return_value = mock_client_instance
+        # Fake message
+        fake_client.messages = [SimpleNamespace(
+            text='{"Content": "Test breach", "Source": "test.com"}', id=123, date=FROZEN_TS
+        )]
         
-        # Mock message
-        mock_message = Mock()
-        mock_message.text = '{"Content": "Test breach", "Source": "test.com"}'
-        mock_message.id = 123
-        mock_message.date = datetime.now()
+        # Setup config
+        config = Config(
+            api_id='12345',
+            api_hash='abcdef1234567890abcdef1234567890',
+            session_base64=session_b64
+        )
+        monkeypatch.setenv('GITHUB_ACTIONS', 'true')
+        fetcher = TelegramFetcher(config)
         
-        mock_client_instance.iter_messages.return_value = [mock_message]
-        mock_client_instance.get_entity.return_value = Mock()
-        mock_client_instance.is_user_authorized.return_value = True
+        # Mock session creation
+        with patch.object(fetcher.session_manager, 'create_session_file', return_value=True):
+            result = await fetcher._fetch_messages()
         
-        # Setup config
-        with patch.dict(os.environ, {
-            'API_ID': '12345',
-            'API_HASH': 'abcdef1234567890abcdef1234567890',
-            'GITHUB_ACTIONS': 'true'
-        }):
-            config = Config()
-            fetcher = TelegramFetcher(config)
-            
-            # Mock session creation
-            with patch.object(fetcher.session_manager, 'create_session_file', return_value=True):
-                result = await fetcher._fetch_messages()
-                
-                assert len(result) == 1
-                assert result[0]["Content"] == "Test breach"
-                assert result[0]["Source"] == "test.com"
-    
-    @patch('telethon.TelegramClient')
-    async def test_fetch_messages_rate_limit(self, mock_client):
+        assert len(result) == 1
+        assert result[0]["Content"] == "Test breach"
+        assert result[0]["Source"] == "test.com"
+    
+    async def test_fetch_messages_batched(self, fake_client, config, tmp_cwd):
+        """Test that a large fetch is requested in bulk and parsed as one batch"""
+        fake_client.messages = [
+            SimpleNamespace(text=f"Test breach {i}", id=i, date=FROZEN_TS)
+            for i in range(500)
+        ]
+        
+        fetcher = TelegramFetcher(config)
+        with patch('fetch_secure_session_improved.asyncio.to_thread', wraps=asyncio.to_thread) as to_thread:
+            result = await fetcher._fetch_messages()
+        
+        assert len(result) == 500
+        assert fake_client.requests[0]["limit"] >= 100
+        # All 500 messages are parsed in a single worker-thread call
+        to_thread.assert_called_once_with(fetcher._parse_batch, [
+            (message.id, message.date, message.text) for message in fake_client.messages
+        ])
+    
+    async def test_fetch_messages_concurrent(self, fake_client, tmp_cwd):
+        """Test that several channels are fetched concurrently"""
+        channels = ['alpha', 'bravo', 'charlie', 'delta', 'echo']
+        
+        fake_client.latency = 0.05  # Simulated per-channel network latency
+        fake_client.messages = lambda channel: [
+            SimpleNamespace(text=f"Test breach from {channel}", id=1, date=FROZEN_TS)
+        ]
+        
+        config = Config(
+            api_id='12345',
+            api_hash='abcdef1234567890abcdef1234567890',
+            channel=','.join(channels),
+            max_concurrent_fetches=5
+        )
+        assert config.validate() is True
+        
+        fetcher = TelegramFetcher(config)
+        result = await fetcher._fetch_messages()
+        
+        assert sorted(msg["Content"] for msg in result) == [
+            f"Test breach from {channel}" for channel in channels
+        ]
+        assert fake_client.max_in_flight == len(channels)  # Sequential fetching would peak at 1
+    
+    async def test_parse_batch(self, config):
+        """Test parsing raw message tuples off the event loop"""
+        fetcher = TelegramFetcher(config)
+        raw_messages = [
+            (1, FROZEN_TS, "Simple breach message"),
+            (2, FROZEN_TS, "   ")
+        ]
+        
+        result = await asyncio.to_thread(fetcher._parse_batch, raw_messages)
+        assert len(result) == 1
+        assert result[0]["Content"] == "Simple breach message"
+        assert result[0]["message_id"] == 1
+        assert result[0]["timestamp"] == FROZEN_TS.isoformat()
+        assert len(result[0]["hash_id"]) == 16
+    
+    async def test_fetch_messages_rate_limit(self, fake_client, config, tmp_cwd):
         """Test handling of rate limiting"""
         from telethon.errors import FloodWaitError
         
-        mock_client_instance = AsyncMock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.get_entity.side_effect = FloodWaitError(60)
+        fake_client.entity_error = FloodWaitError(60)
         
-        with patch.dict(os.environ, {
-            'API_ID': '12345',
-            'API_HASH': 'abcdef1234567890abcdef1234567890'
-        }):
-            config = Config()
-            fetcher = TelegramFetcher(config)
-            
-            result = await fetcher.fetch_messages_with_retry()
-            assert result == []
+        fetcher = TelegramFetcher(config)
+        
+        result = await fetcher.fetch_messages_with_retry()
+        assert result == []
 
 # Integration tests
 @pytest.mark.asyncio
@@ -258,22 +621,114 @@ class TestIntegration:
 class TestPerformance:
     """Performance tests"""
     
-    def test_large_data_processing(self):
-        """Test processing of large datasets"""
-        # Create large dataset
-        large_dataset = [
+    def test_large_data_processing(self, monkeypatch):
+        """Test deduplication of large overlapping datasets, test_dedup_perf times the same workload"""
+        # Lift the storage cap so every unique message is kept
+        monkeypatch.setattr(fetcher_module, "MAX_STORED_MESSAGES", 20000)
+        
+        existing = [
             {"Content": f"Test breach {i}", "Source": "test.com"}
             for i in range(10000)
         ]
+        # Half duplicates of existing rows, half new
+        new = [
+            {"Content": f"Test breach {i}", "Source": "test.com"}
+            for i in range(5000, 15000)
+        ]
+        
+        result = DataProcessor.deduplicate_messages(existing, new)
         
-        # Test deduplication performance
-        import time
-        start_time = time.time()
-        result = DataProcessor.deduplicate_messages(large_dataset, [])
-        end_time = time.time()
+        assert len(result) == 15000
+        assert len({msg["hash_id"] for msg in result}) == 15000
+    
+    @pytest.mark.benchmark(group="dedup")
+    def test_dedup_perf(self, request, monkeypatch):
+        """Benchmark deduplication of overlapping datasets, compare runs with --benchmark-autosave"""
+        pytest.importorskip("pytest_benchmark")
+        benchmark = request.getfixturevalue("benchmark")
+        monkeypatch.setattr(fetcher_module, "MAX_STORED_MESSAGES", 20000)
+        
+        def setup():
+            # Fresh rows every round, deduplication caches hash_id on the rows it sees
+            existing = [
+                {"Content": f"Test breach {i}", "Source": "test.com"}
+                for i in range(10000)
+            ]
+            new = [
+                {"Content": f"Test breach {i}", "Source": "test.com"}
+                for i in range(5000, 15000)
+            ]
+            return (existing, new), {}
+        
+        result = benchmark.pedantic(DataProcessor.deduplicate_messages, setup=setup, rounds=20)
+        assert len(result) == 15000
+    
+    @pytest.mark.parametrize("newest_first", [True, False])
+    def test_deduplicate_messages_bounded(self, newest_first):
+        """Test that the newest messages are kept once the store is full, whatever the input order"""
+        def message(i):
+            return {
+                "Content": f"Test breach {i}", "Source": "test.com", "message_id": i,
+                "timestamp": (FROZEN_TS + timedelta(minutes=i)).isoformat()
+            }
+        
+        # data.json and iter_messages are both newest first
+        existing = [message(i) for i in range(10000)]
+        new = [message(i) for i in range(10000, 10002)]
+        if newest_first:
+            existing.reverse()
+            new.reverse()
+        
+        result = DataProcessor.deduplicate_messages(existing, new)
         
         assert len(result) == 10000
-        assert end_time - start_time < 5.0  # Should complete within 5 seconds
+        assert [msg["message_id"] for msg in result] == list(range(10001, 1, -1))
+    
+    def test_deduplicate_messages_sharded(self, monkeypatch):
+        """Test that sharded deduplication on a process pool matches the serial pass"""
+        monkeypatch.setattr(fetcher_module, "DEDUP_SHARD_SIZE", 100)
+        
+        def build():
+            # Duplicates span shard boundaries, with spam and empty rows mixed in
+            existing = [{"Content": f"Test breach {i % 300}", "Source": "test.com"} for i in range(500)]
+            new = [{"Content": "Hello world", "Source": "test.com"}, {"Content": "  ", "Source": "test.com"}]
+            new += [{"Content": f"Test breach {i}", "Source": "test.com"} for i in range(250, 400)]
+            return existing, new
+        
+        serial = DataProcessor.deduplicate_messages(*build())
+        existing, new = build()
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            sharded = DataProcessor.deduplicate_messages(existing, new, executor=executor)
+        
+        assert list(sharded) == list(serial)
+        assert len(sharded) == 400
+        # Legacy rows keep the fingerprint computed in the worker
+        assert existing[0]["hash_id"] == content_hash("Test breach 0")
+    
+    @pytest.mark.skipif((os.cpu_count() or 1) < 4, reason="needs at least 4 cores")
+    def test_deduplicate_parallel_speedup(self, monkeypatch):
+        """Test that sharding 100k messages across processes beats the serial pass"""
+        monkeypatch.setattr(fetcher_module, "MAX_STORED_MESSAGES", 100000)
+        
+        def build():
+            return [
+                {"Content": f"Test breach {i} database leaked " + "x" * 200, "Source": "test.com"}
+                for i in range(100000)
+            ], []
+        
+        start_time = time.perf_counter()
+        serial = DataProcessor.deduplicate_messages(*build())
+        t_serial = time.perf_counter() - start_time
+        
+        with ProcessPoolExecutor() as executor:
+            executor.submit(int).result()  # Start the workers outside the timed section
+            messages = build()
+            start_time = time.perf_counter()
+            sharded = DataProcessor.deduplicate_messages(*messages, executor=executor)
+            t_parallel = time.perf_counter() - start_time
+        
+        assert len(sharded) == len(serial) == 100000
+        assert t_parallel < 0.6 * t_serial
 
 if __name__ == "__main__":
     pytest.main([__file__]) 
\ No newline at end of file
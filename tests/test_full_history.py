@@ -0,0 +1,239 @@
+import pytest
+import orjson
+import asyncio
+import errno
+import io
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone, timedelta
+from types import SimpleNamespace
+
+# Import the classes we want to test
+import fetch_entire_history as history_module
+from fetch_entire_history import FullHistoryFetcher
+from fetch_secure_session_improved import TelegramFetcher
+from breach_utils import build_indicator_automaton, content_hash
+
+FROZEN_TS = datetime(2024, 1, 1, tzinfo=timezone.utc)
+FROZEN_ISO = FROZEN_TS.isoformat()
+BREACH_POST = {"Source": "example.com", "Content": "Database leak with user emails and passwords", "Type": "Data leak"}
+
+class BrokenPoolExecutor(ThreadPoolExecutor):
+    """Executor whose worker processes have died"""
+    
+    def submit(self, fn, *args, **kwargs):
+        raise BrokenProcessPool("A process in the process pool was terminated abruptly")
+
+class FullSpool(io.BytesIO):
+    """Spool file whose writes fail as on a full disk"""
+    
+    def write(self, data):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+class TestProcessBatch:
+    """Test batch parsing in the worker processes"""
+    
+    @pytest.mark.parametrize("text", [
+        orjson.dumps(BREACH_POST).decode(),
+        orjson.dumps(orjson.dumps(BREACH_POST).decode()).decode(),  # Double-encoded post
+        "**🔹 " + orjson.dumps(BREACH_POST).decode() + "\n**🔹 ****t.me/breachdetector**** 🔹**",  # Watermarked post
+    ])
+    def test_process_batch_json_post(self, text):
+        """Test that plain, string-encoded and watermarked JSON posts are accepted"""
+        json_messages, relevant = FullHistoryFetcher.process_batch([(7, FROZEN_ISO, text)])
+        
+        assert json_messages == 1
+        assert relevant == [{
+            **BREACH_POST,
+            "message_id": 7,
+            "timestamp": FROZEN_ISO,
+            "hash_id": relevant[0]["hash_id"]
+        }]
+        assert len(relevant[0]["hash_id"]) == 16
+    
+    def test_process_batch_hash_matches_incremental_fetch(self, config):
+        """Test that both fetchers fingerprint the same post identically"""
+        post = {**BREACH_POST, "Content": BREACH_POST["Content"] + "  "}
+        _, relevant = FullHistoryFetcher.process_batch([(1, FROZEN_ISO, orjson.dumps(post).decode())])
+        incremental = TelegramFetcher(config)._parse_batch([(1, FROZEN_TS, orjson.dumps(post).decode())])
+        
+        assert relevant[0]["hash_id"] == incremental[0]["hash_id"]
+    
+    def test_process_batch_scrubs_decoded_fields(self):
+        """Test that decoded fields are cleaned and Content is capped after decoding"""
+        post = {
+            "Source": "<b>example.com</b>",
+            "Content": "Database leak t.me/breachdetector " + "password " * 300,
+            "Type": "Unknown type"
+        }
+        _, relevant = FullHistoryFetcher.process_batch([(1, FROZEN_ISO, orjson.dumps(post).decode())])
+        
+        assert relevant[0]["Source"] == "bexample.com/b"
+        assert "t.me/breachdetector" not in relevant[0]["Content"]
+        assert len(relevant[0]["Content"]) == history_module.MAX_CONTENT_LENGTH
+        assert relevant[0]["Type"] == "Other"
+    
+    def test_process_batch_long_post(self):
+        """Test that a post longer than twice the Content cap still decodes"""
+        post = {**BREACH_POST, "Content": "Database leak " + "x" * 4000}
+        json_messages, relevant = FullHistoryFetcher.process_batch([(1, FROZEN_ISO, orjson.dumps(post).decode())])
+        
+        assert json_messages == 1
+        assert relevant[0]["Content"] == post["Content"][:history_module.MAX_CONTENT_LENGTH]
+    
+    def test_process_batch_skips_plain_text_and_spam(self):
+        """Test that non-JSON posts and irrelevant JSON posts are dropped"""
+        spam = orjson.dumps({"Source": "shop.com", "Content": "Buy premium tool, discount offer"}).decode()
+        json_messages, relevant = FullHistoryFetcher.process_batch([
+            (1, FROZEN_ISO, "Database leak, Content not in JSON"),
+            (2, FROZEN_ISO, spam)
+        ])
+        
+        assert json_messages == 1
+        assert relevant == []
+
+class TestIndicatorMatchers:
+    """Test that every relevance matcher scores indicators the same way"""
+    
+    @pytest.fixture(params=["hyperscan", "automaton", "substrings"])
+    def matcher(self, request, monkeypatch):
+        """Each matcher with its compiled indicators installed"""
+        if request.param == "hyperscan":
+            pytest.importorskip("hyperscan")
+            monkeypatch.setattr(history_module, "_INDICATOR_DB", history_module._build_indicator_database(), raising=False)
+            return history_module._relevant_with_hyperscan
+        if request.param == "automaton":
+            pytest.importorskip("ahocorasick")
+            monkeypatch.setattr(history_module, "_INDICATOR_AC", build_indicator_automaton(history_module._BREACH_TUPLE, history_module._SPAM_TUPLE), raising=False)
+            return history_module._relevant_with_automaton
+        return history_module._relevant_with_substrings
+    
+    @pytest.mark.parametrize("content_lower,expected", [
+        ("database leak with user emails and passwords", True),
+        ("buy premium tool, discount offer", False),
+        ("leak leak leak, join our channel", False),  # One distinct breach indicator against two spam
+        ("stolen credentials dump for sale", True),
+        ("nothing to see here", False),
+        ("", False),
+    ])
+    def test_matchers_agree(self, matcher, content_lower, expected):
+        """Test breach and spam scoring on distinct indicators"""
+        assert matcher(content_lower) is expected
+
+class TestSaveData:
+    """Test merging the NDJSON spool into data.json"""
+    
+    def test_save_data_keeps_newest_copy_per_hash(self, tmp_cwd):
+        """Test that duplicates collapse to their newest copy, written newest first"""
+        def record(content, minutes, message_id):
+            return {
+                "Source": "example.com", "Content": content, "Type": "Data leak",
+                "message_id": message_id,
+                "timestamp": (FROZEN_TS + timedelta(minutes=minutes)).isoformat(),
+                "hash_id": content_hash(content)
+            }
+        
+        spooled = [
+            record("Database leak A", 1, 1),
+            record("Database leak B", 2, 2),
+            record("Database leak A", 3, 3),  # Newer repost of A
+        ]
+        fetcher = FullHistoryFetcher()
+        with open(fetcher.spool_file, 'wb') as f:
+            for msg in spooled:
+                f.write(orjson.dumps(msg, option=orjson.OPT_APPEND_NEWLINE))
+        
+        fetcher.save_data()
+        
+        saved = orjson.loads((tmp_cwd / 'data.json').read_bytes())
+        assert [msg["message_id"] for msg in saved] == [3, 2]
+        assert not os.path.exists(fetcher.spool_file)
+        # The backup is streamable NDJSON with the same rows
+        [backup] = tmp_cwd.glob('data_backup_full_history_*.ndjson')
+        assert [orjson.loads(line) for line in backup.read_bytes().splitlines()] == saved
+
+class TestLogging:
+    """Test that log files are only created by a run"""
+    
+    def test_import_writes_no_log_file(self, tmp_path):
+        """Test that importing either fetcher leaves the working directory empty"""
+        env = {**os.environ, "PYTHONPATH": os.path.dirname(history_module.__file__)}
+        subprocess.run(
+            [sys.executable, "-c", "import fetch_entire_history, fetch_secure_session_improved"],
+            cwd=tmp_path, env=env, check=True
+        )
+        
+        assert list(tmp_path.iterdir()) == []
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("telegram_env")
+class TestFetchEntireHistory:
+    """Test the producer, queue and process pool pipeline"""
+    
+    @pytest.fixture
+    def history_client(self, fake_client, session_b64, tmp_cwd, monkeypatch):
+        """Fake client behind fetch_entire_history, with small batches across two workers"""
+        monkeypatch.setenv('TELEGRAM_SESSION_BASE64', session_b64)
+        monkeypatch.setattr(history_module, 'TelegramClient', lambda *args, **kwargs: fake_client)
+        monkeypatch.setattr(history_module, 'BATCH_SIZE', 2)
+        monkeypatch.setattr(history_module, 'WORKER_COUNT', 2)
+        return fake_client
+    
+    @staticmethod
+    def breach_messages(count):
+        """Relevant JSON posts, newest last"""
+        return [
+            SimpleNamespace(
+                text=orjson.dumps({**BREACH_POST, "Content": f"Database leak {i} with user emails"}).decode(),
+                id=i, date=FROZEN_TS + timedelta(minutes=i)
+            )
+            for i in range(count)
+        ]
+    
+    async def test_fetch_entire_history_spools_relevant_posts(self, history_client):
+        """Test that posts flow through several batches and workers into the spool"""
+        history_client.messages = self.breach_messages(5) + [
+            SimpleNamespace(text="Plain chatter", id=10, date=FROZEN_TS),
+            SimpleNamespace(text=orjson.dumps({"Source": "shop.com", "Content": "Buy premium"}).decode(),
+                            id=11, date=FROZEN_TS),
+            SimpleNamespace(text=None, id=12, date=FROZEN_TS),
+        ]
+        
+        fetcher = FullHistoryFetcher()
+        assert await fetcher.fetch_entire_history() == 5
+        
+        with open(fetcher.spool_file, 'rb') as f:
+            spooled = [orjson.loads(line) for line in f]
+        assert sorted(msg["message_id"] for msg in spooled) == [0, 1, 2, 3, 4]
+        assert all(msg["hash_id"] == content_hash(msg["Content"]) for msg in spooled)
+        # The session file is wiped once the fetch finishes
+        assert not os.path.exists(fetcher.session_file)
+    
+    async def test_fetch_entire_history_broken_pool_is_fatal(self, history_client, monkeypatch):
+        """Test that a dead worker process aborts the whole fetch instead of skipping batches"""
+        monkeypatch.setattr(history_module, 'ProcessPoolExecutor', BrokenPoolExecutor)
+        history_client.messages = self.breach_messages(20)
+        
+        fetcher = FullHistoryFetcher()
+        with pytest.raises(BrokenProcessPool):
+            await asyncio.wait_for(fetcher.fetch_entire_history(), timeout=5)
+        assert not os.path.exists(fetcher.session_file)
+    
+    async def test_fetch_entire_history_spool_write_error(self, history_client, monkeypatch):
+        """Test that a failing spool write stops the producer instead of leaving it on a full queue"""
+        real_open = open
+        
+        def spool_open(path, *args, **kwargs):
+            if path == 'data.ndjson.tmp':
+                return FullSpool()
+            return real_open(path, *args, **kwargs)
+        
+        monkeypatch.setattr(history_module, 'ProcessPoolExecutor', ThreadPoolExecutor)
+        monkeypatch.setattr(history_module, 'open', spool_open, raising=False)
+        history_client.messages = self.breach_messages(20)
+        
+        fetcher = FullHistoryFetcher()
+        assert await asyncio.wait_for(fetcher.fetch_entire_history(), timeout=5) == 0